@@ -0,0 +1,185 @@
+"""Админка для таблиц с миллионами строк.
+
+Стандартный список в админке на каждой странице выполняет точный
+``COUNT(*)`` (дважды, если есть фильтр), иерархия дат строит варианты
+через ``SELECT DISTINCT`` по всей таблице, а виджет автодополнения в
+``list_editable`` делает по запросу на строку. ``LargeTableAdmin``
+заменяет точное число строк оценкой, варианты иерархии дат строит по
+первой и последней дате, а подписи связанных объектов берёт из строк,
+уже загруженных через ``list_select_related``.
+
+Выгрузка отфильтрованного списка в CSV или JSONL идёт потоком: строки
+читаются из базы итератором порциями по ``EXPORT_CHUNK_SIZE`` и сразу
+отдаются клиенту.
+"""
+import csv
+import json
+
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import AutoField, Max
+from django.forms.models import BaseModelFormSet
+from django.http import Http404, StreamingHttpResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+
+EXACT_COUNT_LIMIT = 10000
+EXPORT_CHUNK_SIZE = 2000
+
+
+def estimate_rows(model):
+    """Оценка числа строк таблицы по наибольшему автоинкрементному id."""
+    if not isinstance(model._meta.pk, AutoField):
+        return None
+    return model._default_manager.aggregate(estimate=Max('pk'))['estimate']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор без точного ``COUNT(*)`` по большим выборкам.
+
+    Вся таблица оценивается по наибольшему id. Отфильтрованная выборка
+    считается не дальше ``EXACT_COUNT_LIMIT`` строк, поэтому по ней
+    можно пролистать только первые столько результатов.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:EXACT_COUNT_LIMIT].count()
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, которому выбранный объект можно передать готовым.
+
+    ``preloaded`` — пара (pk, подпись) или пустой кортеж; без него виджет
+    сам загружает выбранный объект, как стандартный.
+    """
+
+    preloaded = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = {str(item) for item in value if item not in ('', None)}
+        if (self.preloaded is None
+                or selected != {str(pk) for pk in self.preloaded[:1]}):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        if self.preloaded:
+            pk, label = self.preloaded
+            options.append(
+                self.create_option(name, pk, label, True, len(options)))
+        return [(None, options, 0)]
+
+
+class PreloadedChoicesFormSet(BaseModelFormSet):
+    """Формы ``list_editable``, отдающие виджетам уже загруженные объекты."""
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        for name, field in form.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if isinstance(widget, PreloadedAutocompleteSelect):
+                related = getattr(form.instance, name)
+                widget.preloaded = ()
+                if related is not None:
+                    widget.preloaded = (
+                        related.pk, field.label_from_instance(related))
+        return form
+
+
+class _Echo:
+    """Файл для ``csv.writer``, который возвращает строку, а не пишет её."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(fields, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder,
+                         ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', _csv_lines),
+    'jsonl': ('application/x-ndjson', _jsonl_lines),
+}
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Настройки списка для больших таблиц.
+
+    ``export_fields`` — поля (можно через ``__``) для выгрузки списка;
+    без них выгрузки нет.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/large_table_change_list.html'
+    export_fields = ()
+
+    def get_urls(self):
+        urls = super().get_urls()
+        if not self.export_fields:
+            return urls
+        opts = self.model._meta
+        return [
+            path('export/<str:export_format>/',
+                 self.admin_site.admin_view(self.export_view),
+                 name=f'{opts.app_label}_{opts.model_name}_export'),
+        ] + urls
+
+    def changelist_view(self, request, extra_context=None):
+        if self.export_fields:
+            opts = self.model._meta
+            extra_context = dict(extra_context or {}, export_urls={
+                export_format: reverse(
+                    f'admin:{opts.app_label}_{opts.model_name}_export',
+                    args=[export_format])
+                for export_format in EXPORT_FORMATS
+            })
+        return super().changelist_view(request, extra_context)
+
+    def export_view(self, request, export_format):
+        """Выгружает список с текущими фильтрами, поиском и сортировкой."""
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        if export_format not in EXPORT_FORMATS:
+            raise Http404
+        content_type, lines = EXPORT_FORMATS[export_format]
+        changelist = self.get_changelist_instance(request)
+        rows = changelist.queryset.values_list(
+            *self.export_fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            lines(self.export_fields, rows), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.model._meta.model_name}'
+            f'.{export_format}"')
+        return response
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        autocomplete = db_field.name in self.get_autocomplete_fields(request)
+        if autocomplete and 'widget' not in kwargs:
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs.setdefault('formset', PreloadedChoicesFormSet)
+        return super().get_changelist_formset(request, **kwargs)
@@ -0,0 +1,55 @@
+"""Фоновые пулы потоков для работы после фиксации транзакции.
+
+Число потоков задаётся настройкой; при нуле задача выполняется сразу в
+текущем потоке вне бюджета запросов страницы (так настроены тесты).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .query_budget import unbudgeted
+
+
+class WorkerPool:
+    """Пул из ``settings.<setting>`` потоков, создаваемый при первой задаче.
+
+    Ошибки задачи пул не перехватывает: их обрабатывает сама задача.
+    """
+
+    def __init__(self, setting, thread_name_prefix):
+        self.setting = setting
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self):
+        return getattr(settings, self.setting)
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix=self.thread_name_prefix)
+            return self._executor
+
+    def submit(self, func, *args):
+        """Выполняет ``func(*args)`` в пуле или сразу, если потоков нет."""
+        if self.workers:
+            return self.executor().submit(_in_background, func, *args)
+        with unbudgeted():
+            func(*args)
+
+    def submit_on_commit(self, func, *args):
+        """Как ``submit``, но после фиксации текущей транзакции."""
+        transaction.on_commit(lambda: self.submit(func, *args))
+
+
+def _in_background(func, *args):
+    try:
+        func(*args)
+    finally:
+        connection.close()
@@ -0,0 +1,352 @@
+"""Двухуровневый кеш: память процесса (L1) перед общим SQLite (L2).
+
+L2 — файл SQLite, общий для всех процессов сервера; в нём хранятся
+значения и журнал изменений. L1 — небольшой LRU-словарь в памяти процесса,
+общий для его потоков. Каждая запись в L2 добавляет строку в журнал,
+и все процессы не реже раза в ``POLL_INTERVAL`` секунд читают новые строки
+журнала и выбрасывают из своего L1 изменённые ключи. Так запись в одном
+процессе вытесняет копии во всех остальных, а задержка ограничена
+интервалом опроса.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'LOCATION': '/var/cache/yatube/cache.sqlite3',
+            'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'POLL_INTERVAL': 0.5},
+        },
+    }
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+L1_MAX_ENTRIES = 1000
+L1_TIMEOUT = 60
+POLL_INTERVAL = 0.5
+JOURNAL_TIMEOUT = 60 * 60
+JOURNAL_PRUNE_EVERY = 1000
+CULL_PROBABILITY = 0.01
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE TABLE IF NOT EXISTS journal ('
+    ' seq INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL,'
+    ' key TEXT, created REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS journal_created ON journal (created)',
+)
+
+_MISSING = object()
+_l1_stores = {}
+_l1_stores_lock = threading.Lock()
+
+
+class _L1Store:
+    """Память процесса: LRU со сроками жизни и положением в журнале."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.RLock()
+        self.stats = dict.fromkeys(
+            ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses'), 0)
+        self._reset()
+
+    def _reset(self):
+        self.data = OrderedDict()
+        self.pid = os.getpid()
+        self.origin = f'{self.pid}:{uuid4().hex}'
+        self.last_seq = None
+        self.last_poll = 0.0
+
+    def check_fork(self):
+        # После fork у дочернего процесса должен быть свой журнальный id,
+        # иначе он пропустит изменения, сделанные родителем.
+        if self.pid != os.getpid():
+            with self.lock:
+                self._reset()
+
+    def get(self, key, now):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return _MISSING
+            value, expires = item
+            if expires <= now:
+                del self.data[key]
+                return _MISSING
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires):
+        with self.lock:
+            self.data[key] = (value, expires)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+
+class TwoTierCache(BaseCache):
+    """Кеш с L1 в памяти процесса и общим L2 в SQLite."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.l1_timeout = options.get('L1_TIMEOUT', L1_TIMEOUT)
+        self.poll_interval = options.get('POLL_INTERVAL', POLL_INTERVAL)
+        with _l1_stores_lock:
+            if location not in _l1_stores:
+                _l1_stores[location] = _L1Store(
+                    options.get('L1_MAX_ENTRIES', L1_MAX_ENTRIES))
+            self._l1 = _l1_stores[location]
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
+
+    def _write(self, statements):
+        """Выполняет изменения L2 и запись в журнал одной транзакцией."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return result
+
+    def _journal(self, db, key):
+        db.execute(
+            'INSERT INTO journal (origin, key, created) VALUES (?, ?, ?)',
+            (self._l1.origin, key, time.time()))
+
+    def _poll(self, now):
+        """Выбрасывает из L1 ключи, изменённые другими процессами."""
+        l1 = self._l1
+        l1.check_fork()
+        if now - l1.last_poll < self.poll_interval:
+            return
+        with l1.lock:
+            if now - l1.last_poll < self.poll_interval:
+                return
+            stale = now - l1.last_poll > JOURNAL_TIMEOUT / 2
+            if l1.last_seq is None or stale:
+                # Часть журнала могла быть уже удалена: начинаем с чистого L1.
+                l1.clear()
+                l1.last_seq = self._db.execute(
+                    'SELECT COALESCE(MAX(seq), 0) FROM journal').fetchone()[0]
+            first_seq = l1.last_seq
+            rows = self._db.execute(
+                'SELECT seq, origin, key FROM journal WHERE seq > ? '
+                'ORDER BY seq', (l1.last_seq,)).fetchall()
+            for seq, origin, key in rows:
+                if origin != l1.origin:
+                    if key is None:
+                        l1.clear()
+                    else:
+                        l1.delete(key)
+                l1.last_seq = seq
+            l1.last_poll = now
+            prune = (first_seq // JOURNAL_PRUNE_EVERY
+                     != l1.last_seq // JOURNAL_PRUNE_EVERY)
+        if prune:
+            self._db.execute(
+                'DELETE FROM journal WHERE created < ?',
+                (now - JOURNAL_TIMEOUT,))
+
+    def _remember(self, key, value, expires, now):
+        local_expires = now + self.l1_timeout
+        if expires is not None:
+            local_expires = min(expires, local_expires)
+        self._l1.set(key, value, local_expires)
+
+    def _full_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        now = time.time()
+        self._poll(now)
+        full_keys = {self._full_key(key, version): key for key in keys}
+        found = {}
+        missing = []
+        for full_key, key in full_keys.items():
+            value = self._l1.get(full_key, now)
+            if value is _MISSING:
+                self._l1.count('l1_misses')
+                missing.append(full_key)
+            else:
+                self._l1.count('l1_hits')
+                found[key] = pickle.loads(value)
+        if missing:
+            placeholders = ', '.join('?' * len(missing))
+            rows = self._db.execute(
+                f'SELECT key, value, expires FROM cache '
+                f'WHERE key IN ({placeholders})', missing).fetchall()
+            for full_key, value, expires in rows:
+                if expires is not None and expires <= now:
+                    continue
+                self._remember(full_key, value, expires, now)
+                found[full_keys[full_key]] = pickle.loads(value)
+        for full_key in missing:
+            hit = full_keys[full_key] in found
+            self._l1.count('l2_hits' if hit else 'l2_misses')
+        return found
+
+    def _store(self, db, key, value, expires):
+        db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)', (key, value, expires))
+        self._journal(db, key)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        pickled = {
+            self._full_key(key, version): pickle.dumps(
+                value, pickle.HIGHEST_PROTOCOL)
+            for key, value in data.items()
+        }
+
+        def statements(db):
+            for key, value in pickled.items():
+                self._store(db, key, value, expires)
+
+        self._write(statements)
+        for key, value in pickled.items():
+            self._remember(key, value, expires, now)
+        if random.random() < CULL_PROBABILITY:
+            self.cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        key = self._full_key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        def statements(db):
+            row = db.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and (row[0] is None or row[0] > now):
+                return False
+            self._store(db, key, value, expires)
+            return True
+
+        added = self._write(statements)
+        if added:
+            self._remember(key, value, expires, now)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        now = time.time()
+        key = self._full_key(key, version)
+
+        def statements(db):
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                raise ValueError(f"Key '{key}' not found")
+            new_value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL)
+            self._store(db, key, pickled, row[1])
+            return new_value, pickled, row[1]
+
+        new_value, pickled, expires = self._write(statements)
+        self._remember(key, pickled, expires, now)
+        return new_value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._full_key(key, version)
+        expires = self.get_backend_timeout(timeout)
+
+        def statements(db):
+            updated = db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ?',
+                (expires, key)).rowcount
+            self._journal(db, key)
+            return bool(updated)
+
+        self._l1.delete(key)
+        return self._write(statements)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        full_keys = [self._full_key(key, version) for key in keys]
+
+        def statements(db):
+            for key in full_keys:
+                db.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self._journal(db, key)
+
+        self._write(statements)
+        for key in full_keys:
+            self._l1.delete(key)
+
+    def clear(self):
+        def statements(db):
+            db.execute('DELETE FROM cache')
+            self._journal(db, None)
+
+        self._write(statements)
+        self._l1.clear()
+
+    def cull(self):
+        """Удаляет из L2 истёкшие значения."""
+        now = time.time()
+        self._write(lambda db: db.execute(
+            'DELETE FROM cache WHERE expires <= ?', (now,)).rowcount)
+
+    def stats(self):
+        """Попадания и промахи по уровням в текущем процессе."""
+        with self._l1.lock:
+            return dict(self._l1.stats)
+
+    def close(self, **kwargs):
+        # Соединение с SQLite держится потоком между запросами.
+        pass
@@ -0,0 +1,23 @@
+"""Запросы, которых нет в ORM."""
+from django.db import connection
+
+
+def insert_from_select(model, fields, queryset, ignore_conflicts=False):
+    """Вставляет строки ``queryset`` в таблицу ``model`` одним
+    ``INSERT ... SELECT``, не загружая объекты; возвращает их число.
+
+    ``queryset`` — ``values_list`` со значениями полей ``fields`` в том же
+    порядке. С ``ignore_conflicts`` строки, нарушающие уникальность,
+    пропускаются.
+    """
+    ops = connection.ops
+    select, params = queryset.query.sql_with_params()
+    table = ops.quote_name(model._meta.db_table)
+    columns = ', '.join(
+        ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    insert = ops.insert_statement(ignore_conflicts=ignore_conflicts)
+    suffix = ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {table} ({columns}) {select} {suffix}', params)
+        return cursor.rowcount
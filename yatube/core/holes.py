@@ -0,0 +1,46 @@
+"""Дыры в общих страницах (в духе ESI).
+
+Страница, закешированная один раз для всех пользователей, не может
+содержать ничего личного: шапку с именем, кнопку подписки и т. п. Такие
+фрагменты объявляются «дырами»: функция ``hole`` регистрирует отрисовку
+фрагмента, а тег ``{% hole %}`` при рендере общей страницы оставляет
+вместо него метку. Перед отдачей ``fill`` заменяет метки фрагментами,
+отрисованными для текущего запроса. Вне общего кеша тег рисует фрагмент
+сразу.
+
+Пользовательский текст на страницах экранируется шаблонами, поэтому
+подделать метку в содержимом поста нельзя.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode
+
+_renderers = {}
+
+_MARKER = re.compile(r'<!--hole:(?P<name>[\w-]+):(?P<params>[^>]*)-->')
+
+
+def hole(name):
+    """Регистрирует функцию ``render(request, **params)`` для дыры."""
+    def decorator(render):
+        _renderers[name] = render
+        return render
+    return decorator
+
+
+def render_hole(request, name, params):
+    return _renderers[name](request, **params)
+
+
+def punch(request, name, **params):
+    """Метка дыры на общей странице либо готовый фрагмент."""
+    if getattr(request, 'punch_holes', False):
+        return f'<!--hole:{name}:{urlencode(params)}-->'
+    return render_hole(request, name, params)
+
+
+def fill(request, content):
+    """Заменяет метки в ``content`` фрагментами для ``request``."""
+    return _MARKER.sub(
+        lambda match: render_hole(
+            request, match['name'], dict(parse_qsl(match['params']))),
+        content)
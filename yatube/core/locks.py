@@ -0,0 +1,24 @@
+"""Межпроцессные блокировки на общем кеше."""
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30
+
+
+@contextmanager
+def cache_lock(name, timeout=LOCK_TIMEOUT):
+    """Пытается взять блокировку ``name``; отдаёт True, если удалось.
+
+    Не ждёт: занятая блокировка даёт False. ``timeout`` ограничивает
+    время жизни блокировки, если процесс-владелец упал.
+    """
+    key = f'lock:{name}'
+    token = uuid4().hex
+    acquired = cache.add(key, token, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
@@ -0,0 +1,176 @@
+"""Кеш страниц с инвалидацией по событиям.
+
+Каждая страница зависит от нескольких «областей» (например, ``feed`` или
+``group:<slug>``). У области есть счётчик поколения в кеше; его номер входит
+в ключ страницы. Сигналы записи увеличивают поколение затронутых областей,
+после чего старые копии страниц просто перестают находиться и вытесняются
+по таймауту. Поэтому страницы можно хранить часами без риска показать
+устаревшие данные.
+
+Чтобы истечение таймаута не приводило к лавине одинаковых пересчётов,
+страницу пересчитывает только процесс, взявший блокировку, а остальные
+в это время отдают предыдущую копию (stale-while-revalidate). Кроме того,
+незадолго до истечения копия с небольшой вероятностью пересчитывается
+заранее (алгоритм XFetch), так что одновременных промахов почти не бывает.
+
+Общая (``shared``) страница кешируется одна на всех пользователей, а её
+личные фрагменты подставляются при каждой отдаче (см. ``core.holes``).
+
+Те же поколения дают ETag для условных GET-запросов (``etag``): пока
+области не менялись, клиент получает 304 без обращения к кешу страниц.
+"""
+import math
+import random
+import time
+from functools import wraps
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import holes
+from .locks import cache_lock
+
+GENERATION_PREFIX = 'generation'
+STALE_TIMEOUT = 60 * 10
+EARLY_REFRESH_BETA = 1.0
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _generation_key(scope):
+    # slug и имя пользователя могут содержать символы, недопустимые
+    # в ключах memcached, поэтому область хешируется.
+    return f'{GENERATION_PREFIX}:{md5(scope.encode()).hexdigest()}'
+
+
+def _initial_generation():
+    # Если счётчик вытеснен из кеша, новый не должен совпасть со старым
+    # номером, под которым ещё могут лежать страницы.
+    return int(time.time() * 1000)
+
+
+def generations(scopes):
+    """Текущие поколения областей ``scopes`` в том же порядке."""
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+
+
+def bump(*scopes):
+    """Начинает новое поколение областей: их страницы больше не найдутся.
+
+    Внутри транзакции поколения увеличиваются ещё раз после фиксации:
+    страница, собранная до фиксации по старым данным, останется под
+    промежуточным поколением и больше не найдётся.
+    """
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def etag(request, scopes, *parts):
+    """ETag страницы по поколениям областей, пользователю и ``parts``.
+
+    Пользователь входит в тег, потому что даже общая страница содержит
+    его личные фрагменты.
+    """
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    values = [*generations(scopes), user_id, *parts]
+    return md5('.'.join(str(value) for value in values).encode()).hexdigest()
+
+
+def page_key(request, key_prefix, scopes, shared=False):
+    """Ключ страницы: адрес, пользователь и поколения её областей."""
+    if shared:
+        user_id = 'all'
+    else:
+        user_id = request.user.pk if request.user.is_authenticated else 0
+    generation = '.'.join(str(value) for value in generations(scopes))
+    url = md5(request.get_full_path().encode()).hexdigest()
+    return f'{key_prefix}:{generation}:{user_id}:{url}'
+
+
+def _refresh_due(entry, beta):
+    """Пора ли пересчитать копию: истекла или выпал ранний пересчёт.
+
+    Чем дольше считалась страница и чем ближе истечение, тем вероятнее
+    ранний пересчёт.
+    """
+    _, expires_at, delta = entry
+    early = -delta * beta * math.log(1.0 - random.random())
+    return time.time() + early >= expires_at
+
+
+def _wait_for(key, deadline):
+    """Ждёт, пока владелец блокировки положит страницу в кеш."""
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _respond(request, response, shared):
+    """Подставляет в общую страницу личные фрагменты запроса."""
+    if shared and response.status_code == 200:
+        content = response.content.decode(response.charset)
+        response.content = holes.fill(request, content)
+    return response
+
+
+def cached_page(timeout, key_prefix='', scopes=None, shared=False,
+                stale_timeout=STALE_TIMEOUT, beta=EARLY_REFRESH_BETA):
+    """Замена ``cache_page`` с защитой от одновременных пересчётов.
+
+    ``scopes`` получает именованные аргументы представления и возвращает
+    список областей, от которых зависит страница. Копия считается свежей
+    ``timeout`` секунд и ещё ``stale_timeout`` секунд может отдаваться,
+    пока другой процесс её пересчитывает. При ``shared`` копия общая для
+    всех пользователей, а личные фрагменты шаблона должны быть дырами.
+    """
+    def decorator(view):
+        def compute(key, request, *args, **kwargs):
+            started = time.time()
+            request.punch_holes = shared
+            response = view(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.streaming
+                    and not response.cookies):
+                finished = time.time()
+                entry = (response, finished + timeout, finished - started)
+                cache.set(key, entry, timeout + stale_timeout)
+            return _respond(request, response, shared)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_scopes = scopes(**kwargs) if scopes else []
+            key = page_key(request, key_prefix, page_scopes, shared)
+            entry = cache.get(key)
+            if entry is not None and not _refresh_due(entry, beta):
+                return _respond(request, entry[0], shared)
+            with cache_lock(key) as acquired:
+                if acquired:
+                    return compute(key, request, *args, **kwargs)
+            if entry is None:
+                entry = _wait_for(key, time.monotonic() + LOCK_WAIT)
+            if entry is None:
+                return compute(key, request, *args, **kwargs)
+            return _respond(request, entry[0], shared)
+        return wrapper
+    return decorator
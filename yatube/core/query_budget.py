@@ -0,0 +1,118 @@
+"""Бюджет SQL-запросов на страницу и поиск N+1.
+
+Представление объявляет бюджет декоратором ``query_budget``, а
+``QueryBudgetMiddleware`` записывает все запросы страницы, сравнивает их
+число с бюджетом и ищет одинаковые по форме запросы, повторённые много
+раз: это почти всегда обращение к связанной модели в цикле шаблона.
+
+Фоновая работа, которую при отладке выполняют в потоке запроса (например,
+нарезка миниатюр при ``THUMBNAIL_WORKERS = 0``), оборачивается в
+``unbudgeted`` и в бюджет страницы не входит.
+"""
+import logging
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 3
+
+_PLACEHOLDER_LIST = re.compile(r'\((?:%s, )+%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+_state = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """Страница выполнила больше запросов, чем объявлено, или N+1."""
+
+
+def query_budget(limit):
+    """Объявляет, сколько запросов может выполнить страница."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+@contextmanager
+def unbudgeted():
+    """Не засчитывает запросы блока в бюджет страницы."""
+    paused = getattr(_state, 'paused', False)
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = paused
+
+
+def query_shape(sql):
+    """Нормализует SQL: параметры и списки IN не влияют на форму."""
+    sql = _PLACEHOLDER_LIST.sub('(%s, ...)', sql)
+    return _LITERAL.sub('?', sql)
+
+
+class QueryRecorder:
+    """Обёртка ``connection.execute_wrapper``, запоминающая запросы."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not getattr(_state, 'paused', False):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated_shapes(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Формы запросов, выполненных не меньше ``threshold`` раз."""
+        shapes = Counter(query_shape(sql) for sql in self.queries)
+        return {
+            shape: count for shape, count in shapes.items()
+            if count >= threshold
+        }
+
+    def problems(self, budget=None, threshold=N_PLUS_ONE_THRESHOLD):
+        """Список нарушений бюджета и повторов в человекочитаемом виде."""
+        problems = []
+        if budget is not None and len(self) > budget:
+            problems.append(f'{len(self)} запросов при бюджете {budget}')
+        for shape, count in self.repeated_shapes(threshold).items():
+            problems.append(f'N+1: {count} раз «{shape}»')
+        return problems
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы страницы и сообщает о превышении бюджета и N+1.
+
+    Работает при ``QUERY_BUDGET_ENABLED``; при ``QUERY_BUDGET_RAISE``
+    вместо записи в лог выбрасывает ``QueryBudgetExceeded``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        budget = getattr(request, 'query_budget', None)
+        problems = recorder.problems(budget)
+        if problems:
+            message = f'{request.path}: ' + '; '.join(problems)
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import punch
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """Личный фрагмент страницы: метка в общем кеше или сам фрагмент."""
+    return mark_safe(punch(context['request'], name, **params))
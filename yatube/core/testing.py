@@ -0,0 +1,32 @@
+from django.db import connection
+from django.urls import resolve
+
+from .query_budget import QueryRecorder
+
+
+class QueryBudgetTestMixin:
+    """Проверка бюджета запросов страницы в тестах ``TestCase``."""
+
+    def assertWithinQueryBudget(self, client, url, budget=None, data=None):
+        """Страница ``url`` укладывается в бюджет и не делает N+1.
+
+        Без ``budget`` берётся бюджет, объявленный у представления;
+        с ``data`` страница запрашивается POST с этими данными.
+        """
+        if budget is None:
+            view = resolve(url.split('?')[0]).func
+            budget = getattr(view, 'query_budget', None)
+            self.assertIsNotNone(
+                budget, f'У представления для {url} не объявлен бюджет')
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            if data is None:
+                response = client.get(url)
+            else:
+                response = client.post(url, data)
+        problems = recorder.problems(budget)
+        self.assertFalse(
+            problems,
+            f'{url}: ' + '; '.join(problems)
+            + '\n' + '\n'.join(recorder.queries))
+        return response
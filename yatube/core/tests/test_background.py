@@ -0,0 +1,29 @@
+import threading
+
+from django.test import TestCase, override_settings
+
+from core.background import WorkerPool
+
+
+class WorkerPoolTest(TestCase):
+    def setUp(self):
+        self.threads = []
+        self.pool = WorkerPool('TEST_WORKERS', 'test-pool')
+
+    def record(self, value):
+        self.threads.append((value, threading.current_thread()))
+
+    @override_settings(TEST_WORKERS=0)
+    def test_inline_without_workers(self):
+        """Без потоков задача выполняется в текущем потоке."""
+        self.assertIsNone(self.pool.submit(self.record, 1))
+        self.assertEqual(self.threads, [(1, threading.current_thread())])
+
+    @override_settings(TEST_WORKERS=1)
+    def test_runs_in_pool(self):
+        """С потоками задача уходит в пул с заданным префиксом имени."""
+        self.pool.submit(self.record, 2).result()
+        value, thread = self.threads[0]
+        self.assertEqual(value, 2)
+        self.assertTrue(thread.name.startswith('test-pool'))
+        self.pool.executor().shutdown()
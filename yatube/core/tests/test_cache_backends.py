@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import TwoTierCache, _L1Store
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        location = os.path.join(self.directory, 'cache.sqlite3')
+        params = {'OPTIONS': {'POLL_INTERVAL': 0}}
+        self.cache = TwoTierCache(location, params)
+        # Второй экземпляр с отдельным L1 изображает другой процесс.
+        self.other = TwoTierCache(location, params)
+        self.other._l1 = _L1Store(100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_write_evicts_other_process_copy(self):
+        """Запись в одном процессе вытесняет копию L1 в другом."""
+        self.cache.set('key', 'old')
+        self.assertEqual(self.other.get('key'), 'old')
+        self.cache.set('key', 'new')
+        self.assertEqual(self.other.get('key'), 'new')
+        self.cache.delete('key')
+        self.assertIsNone(self.other.get('key'))
+
+    def test_clear_evicts_other_process_copies(self):
+        """Очистка кеша сбрасывает L1 всех процессов."""
+        self.cache.set_many({'first': 1, 'second': 2})
+        self.assertEqual(
+            self.other.get_many(['first', 'second']),
+            {'first': 1, 'second': 2})
+        self.cache.clear()
+        self.assertEqual(self.other.get_many(['first', 'second']), {})
+
+    def test_add_and_incr_are_shared(self):
+        """add и incr атомарны на уровне L2."""
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(self.other.add('lock', 2))
+        self.assertEqual(self.other.incr('lock'), 2)
+        self.assertEqual(self.cache.incr('lock', 10), 12)
+        self.assertEqual(self.other.get('lock'), 12)
+
+    def test_stats_by_tier(self):
+        """Статистика различает попадания в L1 и в L2."""
+        self.cache.set('key', 'value')
+        self.other.get('key')
+        self.other.get('key')
+        self.other.get('missing')
+        stats = self.other.stats()
+        self.assertEqual(stats['l1_hits'], 1)
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l2_misses'], 1)
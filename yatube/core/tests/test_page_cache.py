@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from core import holes, page_cache
+from core.locks import cache_lock
+
+
+class CachedPageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+        @page_cache.cached_page(60, 'test_page', lambda: ['test'])
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'версия {self.calls}')
+
+        self.view = view
+        self.request = RequestFactory().get('/page/')
+        self.request.user = AnonymousUser()
+        self.key = page_cache.page_key(self.request, 'test_page', ['test'])
+
+    def expire(self):
+        response, _, delta = cache.get(self.key)
+        cache.set(self.key, (response, 0, delta))
+
+    def test_generation_bump_invalidates(self):
+        """Смена поколения области даёт новую копию страницы."""
+        self.view(self.request)
+        self.view(self.request)
+        self.assertEqual(self.calls, 1)
+        page_cache.bump('test')
+        self.assertEqual(self.view(self.request).content, 'версия 2'.encode())
+
+    def test_bump_repeated_after_commit(self):
+        """В транзакции поколение меняется ещё раз после фиксации."""
+        before, = page_cache.generations(['test'])
+        with mock.patch.object(
+                page_cache.transaction, 'on_commit') as on_commit:
+            page_cache.bump('test')
+        self.assertEqual(page_cache.generations(['test']), [before + 1])
+        on_commit.call_args[0][0]()
+        self.assertEqual(page_cache.generations(['test']), [before + 2])
+
+    def test_stale_served_while_locked(self):
+        """Пока другой процесс пересчитывает, отдаётся старая копия."""
+        self.view(self.request)
+        self.expire()
+        with cache_lock(self.key):
+            response = self.view(self.request)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response.content, 'версия 1'.encode())
+        self.assertEqual(self.view(self.request).content, 'версия 2'.encode())
+
+    def test_miss_waits_for_lock_owner(self):
+        """При промахе без блокировки процесс ждёт, а потом считает сам."""
+        with cache_lock(self.key), \
+                mock.patch.object(page_cache, 'LOCK_WAIT', 0.1):
+            self.view(self.request)
+        self.assertEqual(self.calls, 1)
+
+    def test_early_refresh(self):
+        """Незадолго до истечения копия может пересчитаться заранее."""
+        self.view(self.request)
+        response, _, _ = cache.get(self.key)
+        cache.set(self.key, (response, page_cache.time.time() + 1, 10))
+        with mock.patch.object(page_cache.random, 'random',
+                               return_value=0.99):
+            self.view(self.request)
+        self.assertEqual(self.calls, 2)
+
+    def test_shared_page_fills_holes(self):
+        """Общая копия одна на всех, дыры заполняются для каждого запроса."""
+        holes.hole('test_user')(
+            lambda request, prefix: f'{prefix}{request.user.pk}')
+
+        @page_cache.cached_page(60, 'test_shared', shared=True)
+        def view(request):
+            self.calls += 1
+            marker = holes.punch(request, 'test_user', prefix='id=')
+            return HttpResponse(f'страница {marker}')
+
+        self.request.user = mock.Mock(pk=1)
+        self.assertEqual(view(self.request).content, 'страница id=1'.encode())
+        self.request.user = mock.Mock(pk=2)
+        self.assertEqual(view(self.request).content, 'страница id=2'.encode())
+        self.assertEqual(self.calls, 1)
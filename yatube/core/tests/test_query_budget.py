@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core.query_budget import QueryRecorder, query_shape, unbudgeted
+
+User = get_user_model()
+
+
+class QueryRecorderTest(TestCase):
+    def test_repeated_shapes_detected(self):
+        """Одинаковые по форме запросы в цикле считаются N+1."""
+        users = [User.objects.create_user(username=f'user{i}')
+                 for i in range(3)]
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for user in users:
+                User.objects.get(pk=user.pk)
+            list(User.objects.filter(pk__in=[user.pk for user in users]))
+        self.assertEqual(len(recorder), 4)
+        self.assertEqual(list(recorder.repeated_shapes().values()), [3])
+        self.assertEqual(len(recorder.problems(budget=3)), 2)
+
+    def test_unbudgeted_queries_not_recorded(self):
+        """Запросы внутри ``unbudgeted`` в бюджет не входят."""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            with unbudgeted():
+                User.objects.count()
+            User.objects.exists()
+        self.assertEqual(len(recorder), 1)
+
+    def test_query_shape_ignores_parameters(self):
+        """Списки IN и литералы не меняют форму запроса."""
+        self.assertEqual(
+            query_shape('SELECT 1 WHERE id IN (%s, %s) LIMIT 21'),
+            query_shape('SELECT 1 WHERE id IN (%s, %s, %s) LIMIT 10'))
@@ -1,17 +1,114 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.urls import reverse
+from django.utils.html import format_html
 
-from .models import Post, Group, Comment, Follow
+from core.admin_tools import LargeTableAdmin
+from . import bulk, search
+from .models import BulkJob, Post, Group, Comment, Follow
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа',
+        empty_label='без группы')
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
+    export_fields = ('pk', 'pub_date', 'author__username', 'group__slug',
+                     'text', 'image')
+    action_form = PostActionForm
+    actions = ('delete_in_background', 'move_in_background')
+
+    def get_actions(self, request):
+        # Стандартное удаление грузит всю выборку на страницу
+        # подтверждения; его заменяет фоновое.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def _start_job(self, request, queryset, action, group=None):
+        job = bulk.start(request.user, action, queryset, group=group)
+        url = reverse('admin:posts_bulkjob_change', args=[job.pk])
+        self.message_user(request, format_html(
+            'Запущено «{}» для {} постов, ход выполнения: '
+            '<a href="{}">задание #{}</a>.',
+            job.get_action_display(), job.total, url, job.pk),
+            messages.SUCCESS)
+
+    def delete_in_background(self, request, queryset):
+        self._start_job(request, queryset, BulkJob.DELETE)
+    delete_in_background.short_description = 'Удалить в фоне'
+    delete_in_background.allowed_permissions = ('delete',)
+
+    def move_in_background(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.full_clean()
+        self._start_job(request, queryset, BulkJob.MOVE,
+                        form.cleaned_data.get('group'))
+    move_in_background.short_description = 'Перенести в группу в фоне'
+    move_in_background.allowed_permissions = ('change',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт по полнотекстовому индексу, а не LIKE.
+        ids = search.matching_ids(search_term)
+        if ids is None:
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.filter(pk__in=ids), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
+    empty_value_display = '-пусто-'
+
+
+class FollowAdmin(LargeTableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+
+
+class BulkJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'action', 'group', 'status', 'progress_display',
+                    'user', 'created', 'finished')
+    list_filter = ('status', 'action')
+    list_select_related = ('group', 'user')
+    readonly_fields = ('user', 'action', 'group', 'total', 'processed',
+                       'progress_display', 'status', 'error', 'created',
+                       'finished')
+    exclude = ('last_pk', 'lease_until')
+
+    def progress_display(self, job):
+        return f'{job.progress}% ({job.processed} из {job.total})'
+    progress_display.short_description = 'Прогресс'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(BulkJob, BulkJobAdmin)
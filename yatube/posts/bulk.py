@@ -0,0 +1,148 @@
+"""Массовые действия над постами в фоне.
+
+Действие из админки не выполняется в запросе: оно записывается в
+``BulkJob``, а id постов выборки — в ``BulkJobItem`` одним
+``INSERT ... SELECT`` без загрузки объектов. Задание обрабатывается
+порциями по ``CHUNK_SIZE`` постов в порядке id, каждая порция в своей
+транзакции. После порции в задании сохраняются прогресс и последний
+обработанный id, поэтому прерванное задание продолжает команда
+``run_bulk_jobs``.
+
+Обработчик занимает задание атомарным ``UPDATE`` с аренды на
+``LEASE_TIMEOUT`` и продлевает её после каждой порции. Выполняющееся
+задание подхватывается другим обработчиком, только когда аренда истекла.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, IntegerField, Q, Value
+from django.utils import timezone
+
+from core import page_cache
+from core.background import WorkerPool
+from core.db import insert_from_select
+from . import counters, scopes, trending
+from .models import BulkJob, BulkJobItem, Group, Post
+
+CHUNK_SIZE = 500
+LEASE_TIMEOUT = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
+
+_pool = WorkerPool('BULK_JOB_WORKERS', 'bulk-jobs')
+
+
+def delete_posts(posts, job):
+    # Удаление по одному посту: сигналы поправят счётчики и кеши.
+    posts.delete()
+
+
+def move_posts(posts, job):
+    group_id = job.group_id
+    rows = list(posts.exclude(group_id=group_id).values_list(
+        'pk', 'group_id', 'author__username'))
+    if not rows:
+        return
+    Post.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+        group_id=group_id, updated=timezone.now())
+    for old_group_id, moved in Counter(
+            old for _, old, _ in rows).items():
+        counters.bump_group(old_group_id, -moved)
+    counters.bump_group(group_id, len(rows))
+    trending.regroup([pk for pk, _, _ in rows], group_id)
+    group_ids = {old for _, old, _ in rows} | {group_id}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    page_cache.bump(
+        scopes.FEED,
+        *{scopes.author(username) for _, _, username in rows},
+        *[scopes.post(pk) for pk, _, _ in rows],
+        *[scopes.group(slug) for slug in slugs],
+    )
+
+
+ACTIONS = {
+    BulkJob.DELETE: delete_posts,
+    BulkJob.MOVE: move_posts,
+}
+
+
+def _store_items(job, queryset):
+    """Записывает id постов ``queryset`` в задание, возвращает их число."""
+    return insert_from_select(BulkJobItem, ('post_id', 'job'), (
+        queryset.order_by().annotate(
+            job_id=Value(job.pk, output_field=IntegerField()),
+        ).values_list('pk', 'job_id')))
+
+
+def start(user, action, queryset, group=None):
+    """Создаёт задание над выборкой ``queryset`` и ставит его в очередь."""
+    with transaction.atomic():
+        job = BulkJob.objects.create(user=user, action=action, group=group)
+        job.total = _store_items(job, queryset)
+        job.save(update_fields=['total'])
+    schedule(job.pk)
+    return job
+
+
+def claimable(retry_failed=False):
+    """Задания, которые можно занять: в очереди или с истёкшей арендой."""
+    statuses = [BulkJob.PENDING]
+    if retry_failed:
+        statuses.append(BulkJob.FAILED)
+    return BulkJob.objects.filter(
+        Q(status__in=statuses)
+        | Q(status=BulkJob.RUNNING, lease_until__lt=timezone.now()))
+
+
+def claim(job_id, retry_failed=False):
+    """Занимает задание; False, если его уже выполняет другой обработчик."""
+    return bool(claimable(retry_failed).filter(pk=job_id).update(
+        status=BulkJob.RUNNING, lease_until=timezone.now() + LEASE_TIMEOUT))
+
+
+def run(job_id, retry_failed=False):
+    """Обрабатывает задание с места, где оно остановилось.
+
+    Задание, которое не удалось занять, возвращается как есть.
+    """
+    if not claim(job_id, retry_failed):
+        return BulkJob.objects.get(pk=job_id)
+    job = BulkJob.objects.get(pk=job_id)
+    action = ACTIONS[job.action]
+    items = job.items.order_by('post_id').values_list('post_id', flat=True)
+    last_pk = job.last_pk
+    while True:
+        chunk = list(items.filter(post_id__gt=last_pk)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        with transaction.atomic():
+            action(Post.objects.filter(pk__in=chunk), job)
+            last_pk = chunk[-1]
+            BulkJob.objects.filter(pk=job.pk).update(
+                processed=F('processed') + len(chunk), last_pk=last_pk,
+                lease_until=timezone.now() + LEASE_TIMEOUT)
+    BulkJob.objects.filter(pk=job.pk).update(
+        status=BulkJob.DONE, finished=timezone.now(), lease_until=None)
+    job.items.all().delete()
+    job.refresh_from_db()
+    return job
+
+
+def _run_logged(job_id):
+    try:
+        run(job_id)
+    except Exception as error:
+        logger.exception('Задание %s завершилось ошибкой', job_id)
+        BulkJob.objects.filter(pk=job_id).update(
+            status=BulkJob.FAILED, error=str(error), lease_until=None)
+
+
+def schedule(job_id):
+    """Запускает задание в фоновом пуле после фиксации транзакции.
+
+    При ``BULK_JOB_WORKERS = 0`` задание выполняется в текущем потоке.
+    """
+    _pool.submit_on_commit(_run_logged, job_id)
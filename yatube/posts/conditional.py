@@ -0,0 +1,95 @@
+"""Валидаторы условных GET-запросов для страниц постов.
+
+ETag собирается из поколений областей страницы (см. ``core.page_cache``)
+и меняется при любой правке, удалении или подписке. Last-Modified ленты —
+дата самого нового поста в ней; она находится запросом по индексу
+и кешируется под теми же поколениями, так что повторные запросы к
+неизменной ленте не обращаются к базе вовсе. Правки старых постов эту
+дату не сдвигают, но клиент, приславший ``If-None-Match``, проверяется
+по ETag, а ``If-Modified-Since`` тогда не учитывается.
+
+Валидаторы считаются до представления и кеша страниц, поэтому ответ 304
+не рендерит шаблон и не разбирает закешированную копию.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from core import page_cache
+from . import scopes
+from .models import Comment, Post
+
+_MISSING = object()
+
+
+def newest_pub_date(page_scopes, posts):
+    """Дата самого нового поста ``posts`` на текущих поколениях областей."""
+    version = repr([page_scopes, page_cache.generations(page_scopes)])
+    key = f'newest_pub_date:{md5(version.encode()).hexdigest()}'
+    pub_date = cache.get(key, _MISSING)
+    if pub_date is _MISSING:
+        pub_date = posts.order_by('-pub_date', '-id').values_list(
+            'pub_date', flat=True).first()
+        cache.set(key, pub_date, settings.PAGE_CACHE_TIMEOUT)
+    return pub_date
+
+
+def _feed_condition(page_scopes, posts):
+    # page_scopes и posts получают именованные аргументы представления.
+    return condition(
+        etag_func=lambda request, **kwargs: page_cache.etag(
+            request, page_scopes(**kwargs)),
+        last_modified_func=lambda request, **kwargs: newest_pub_date(
+            page_scopes(**kwargs), posts(**kwargs)),
+    )
+
+
+index_page = _feed_condition(scopes.index_page, Post.objects.all)
+group_page = _feed_condition(
+    scopes.group_page, lambda slug: Post.objects.filter(group__slug=slug))
+profile_page = _feed_condition(
+    scopes.profile_page,
+    lambda username: Post.objects.filter(author__username=username))
+
+
+def _post_state(request, post_id):
+    """Дата правки поста, автор, id и дата самого нового комментария.
+
+    Один запрос на страницу: нужен и для ETag, и для Last-Modified.
+    """
+    state = getattr(request, '_post_state', None)
+    if state is None:
+        comments = Comment.objects.filter(post_id=OuterRef('pk')).order_by(
+            '-created', '-id')
+        state = request._post_state = Post.objects.filter(
+            pk=post_id).values_list(
+            'updated', 'author__username',
+            Subquery(comments.values('pk')[:1]),
+            Subquery(comments.values('created')[:1]),
+        ).first()
+    return state
+
+
+def _post_etag(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    updated, username, comment_id, _ = state
+    return page_cache.etag(
+        request, [scopes.post(post_id), scopes.author(username)],
+        updated.isoformat(), comment_id)
+
+
+def _post_last_modified(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    updated, _, _, commented = state
+    return max(updated, commented) if commented else updated
+
+
+post_page = condition(
+    etag_func=_post_etag, last_modified_func=_post_last_modified)
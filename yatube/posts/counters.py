@@ -0,0 +1,92 @@
+"""Денормализованные счётчики постов, комментариев, подписок и ссылок
+на файлы изображений.
+
+Счётчики меняются атомарным ``UPDATE ... SET x = x + 1`` из сигналов,
+а ``reconcile`` пересчитывает их по исходным таблицам.
+"""
+from django.apps import apps as django_apps
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _bump(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def bump_user(user_id, field, delta):
+    """Меняет счётчик пользователя, создавая строку счётчиков при нужде."""
+    UserStats = django_apps.get_model('posts', 'UserStats')
+    stats = UserStats.objects.filter(user_id=user_id)
+    if not _bump(stats, field, delta) and delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        _bump(stats, field, delta)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group = django_apps.get_model('posts', 'Group')
+        _bump(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def bump_post(post_id, delta):
+    if post_id is not None:
+        Post = django_apps.get_model('posts', 'Post')
+        _bump(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def bump_blob(name, delta):
+    """Меняет число постов, ссылающихся на файл изображения ``name``."""
+    if name:
+        ImageBlob = django_apps.get_model('posts', 'ImageBlob')
+        blobs = ImageBlob.objects.filter(name=name)
+        if not _bump(blobs, 'refcount', delta) and delta > 0:
+            ImageBlob.objects.get_or_create(name=name)
+            _bump(blobs, 'refcount', delta)
+
+
+def _count(model, field):
+    """Подзапрос с числом строк ``model``, ссылающихся полем ``field``."""
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(
+        Subquery(rows.annotate(total=Count('pk')).values('total')), 0)
+
+
+def reconcile(apps=django_apps):
+    """Пересчитывает все счётчики по исходным таблицам."""
+    User = apps.get_model('auth', 'User')
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    missing = User.objects.filter(
+        stats__isnull=True).values_list('pk', flat=True)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing.iterator()],
+        batch_size=1000,
+    )
+    Group.objects.update(posts_count=_count(Post, 'group'))
+    Post.objects.update(comments_count=_count(Comment, 'post'))
+    UserStats.objects.update(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+
+
+def reconcile_blobs(apps=django_apps):
+    """Пересчитывает ссылки на файлы изображений по постам."""
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    names = Post.objects.exclude(image='').exclude(
+        image__in=ImageBlob.objects.values('name')
+    ).order_by().values_list('image', flat=True).distinct()
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name) for name in names.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    ImageBlob.objects.update(refcount=_count(Post, 'image'))
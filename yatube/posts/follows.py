@@ -0,0 +1,51 @@
+"""Множество подписок пользователя в кеше.
+
+Проверка «подписан ли A на B» не должна читать из базы весь список
+подписок. id авторов, на которых подписан пользователь, хранятся в
+кеше одним ``frozenset`` под поколением области ``scopes.follows``;
+сигналы подписки и отписки начинают новое поколение. Поколение
+сменяется и сразу, и после фиксации транзакции (см. ``page_cache.bump``):
+множество, прочитанное другим запросом до фиксации, остаётся под
+промежуточным поколением.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import page_cache
+from . import scopes
+from .models import Follow
+
+
+def _key(user_id):
+    scope = scopes.follows(user_id)
+    generation = page_cache.generations([scope])[0]
+    return f'follow_set:{md5(scope.encode()).hexdigest()}:{generation}'
+
+
+def following_ids(user):
+    """id авторов, на которых подписан ``user``."""
+    if not user.is_authenticated:
+        return frozenset()
+    key = _key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True))
+        cache.set(key, ids, settings.PAGE_CACHE_TIMEOUT)
+    return ids
+
+
+def is_following(user, author_id):
+    """Подписан ли ``user`` на автора с id ``author_id``."""
+    return author_id in following_ids(user)
+
+
+def following_among(user, author_ids):
+    """Те из ``author_ids``, на кого подписан ``user``."""
+    return following_ids(user).intersection(author_ids)
+
+
+def invalidate(user_id):
+    page_cache.bump(scopes.follows(user_id))
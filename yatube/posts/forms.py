@@ -1,4 +1,6 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from . import images
 from .models import Post, Comment
 
 
@@ -16,6 +18,12 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError('Нужно заполнить текст поста!')
         return data
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image = images.normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
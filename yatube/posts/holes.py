@@ -0,0 +1,23 @@
+"""Личные фрагменты общих страниц ленты (см. ``core.holes``)."""
+from django.template.loader import render_to_string
+
+from core.holes import hole
+from . import follows
+
+
+@hole('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
+
+
+@hole('switcher')
+def switcher(request):
+    return render_to_string('includes/switcher.html', request=request)
+
+
+@hole('follow_button')
+def follow_button(request, username, author_id):
+    following = follows.is_following(request.user, int(author_id))
+    return render_to_string(
+        'posts/includes/follow_button.html',
+        {'username': username, 'following': following}, request=request)
@@ -0,0 +1,107 @@
+"""Нормализация загруженных изображений постов.
+
+Оригинал приводится к разумному виду один раз при загрузке, чтобы все
+последующие нарезки миниатюр не декодировали 20-мегабайтные фото:
+размер ограничивается ``POST_IMAGE_MAX_SIZE``, поворот из EXIF
+применяется к пикселям, а сами метаданные отбрасываются, JPEG
+сохраняется прогрессивным. GIF уменьшается покадрово и остаётся
+анимированным, прочие форматы (BMP, TIFF и т. п.) перекодируются в PNG.
+Изображения больше ``POST_IMAGE_MAX_PIXELS``
+отвергаются до декодирования (защита от «бомб»). Крупные загрузки
+лежат во временных файлах, а не в памяти процесса.
+"""
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, ImageSequence
+
+SAVE_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {},
+    'GIF': {'optimize': True},
+}
+# Остальные форматы перекодируются в PNG: без потерь и с прозрачностью.
+FALLBACK_FORMAT = 'PNG'
+# Многокадровый JPEG с телефонов сохраняется обычным JPEG.
+SAVE_FORMATS = {'MPO': 'JPEG'}
+QUALITY_FORMATS = ('JPEG', 'WEBP')
+KEPT_INFO = ('icc_profile', 'transparency')
+
+
+def _check_pixels(image):
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение слишком большое: %(width)s×%(height)s.',
+            code='image_too_large',
+            params={'width': width, 'height': height})
+
+
+def _frames(image, limit):
+    """Кадры GIF, уменьшенные до ``limit``."""
+    frames = []
+    for frame in ImageSequence.Iterator(image):
+        frame = frame.copy()
+        frame.thumbnail((limit, limit), Image.LANCZOS)
+        frames.append(frame)
+    return frames
+
+
+def _save(image, save_format, frames=()):
+    options = dict(SAVE_OPTIONS[save_format])
+    if save_format in QUALITY_FORMATS:
+        options['quality'] = settings.POST_IMAGE_QUALITY
+    if 'icc_profile' in image.info:
+        options['icc_profile'] = image.info['icc_profile']
+    if frames:
+        options.update(save_all=True, append_images=frames)
+    content = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(content, save_format, **options)
+    return content
+
+
+def _renamed(name, save_format):
+    """Имя файла с расширением формата, в который он перекодирован."""
+    extension = Image.registered_extensions()
+    if extension.get(os.path.splitext(name)[1].lower()) == save_format:
+        return name
+    return os.path.splitext(name)[0] + f'.{save_format.lower()}'
+
+
+def normalize(upload):
+    """Уменьшенная копия ``upload`` без метаданных."""
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Изображение слишком большое.', code='image_too_large')
+    limit = settings.POST_IMAGE_MAX_SIZE
+    with image:
+        _check_pixels(image)
+        save_format = SAVE_FORMATS.get(image.format, image.format)
+        if save_format not in SAVE_OPTIONS:
+            save_format = FALLBACK_FORMAT
+        frames = []
+        if getattr(image, 'is_animated', False) and save_format == 'GIF':
+            normalized, *frames = _frames(image, limit)
+        else:
+            # JPEG декодируется сразу в уменьшенном масштабе.
+            image.draft('RGB', (limit, limit))
+            normalized = ImageOps.exif_transpose(image)
+            normalized.thumbnail((limit, limit), Image.LANCZOS)
+    normalized.info = {
+        key: value for key, value in normalized.info.items()
+        if key in KEPT_INFO
+    }
+    content = _save(normalized, save_format, frames)
+    size = content.tell()
+    content.seek(0)
+    return UploadedFile(
+        content, _renamed(upload.name, save_format),
+        Image.MIME.get(save_format, upload.content_type), size)
@@ -0,0 +1,322 @@
+"""Потоковый импорт постов, комментариев и подписок со старой платформы.
+
+Файл JSONL (объект на строку) или CSV с заголовком читается потоком и
+пишется порциями по ``CHUNK_SIZE`` записей: каждая порция — один
+``bulk_create`` в своей транзакции вместе с ``ImportCheckpoint``, поэтому
+прерванный импорт продолжается с первой незаписанной записи.
+
+Авторы и группы ищутся по имени и slug в картах, загруженных в память
+один раз; посты для комментариев, занятые id постов и существующие
+подписки — одним запросом на порцию. Записи, не прошедшие проверку или
+повторяющие уже записанные (пост с занятым id, повторная подписка),
+пропускаются с указанием причины, так что в ``imported`` попадают только
+вставленные строки. Конфликт с записью, созданной уже после проверки,
+откатывает порцию: повторный запуск продолжит с неё.
+
+``bulk_create`` не отправляет сигналы, поэтому счётчики, ссылки на файлы
+изображений и ленты подписок пересчитываются после импорта целиком
+(``rebuild``), а кеш страниц сбрасывается новым поколением лент.
+Поисковый индекс ведут триггеры базы. В популярное импортированные
+посты не попадают: это старые записи.
+
+Даты берутся из файла: на время импорта ``auto_now`` и ``auto_now_add``
+у полей дат отключены, поэтому импорт запускается отдельной командой,
+а не в процессе сайта.
+"""
+import csv
+import json
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import page_cache
+from . import counters, scopes, timeline
+from .models import Comment, Follow, Group, ImportCheckpoint, Post
+
+User = get_user_model()
+
+CHUNK_SIZE = 1000
+
+
+class InvalidRow(Exception):
+    """Запись файла не прошла проверку."""
+
+
+def jsonl_rows(file):
+    for line in file:
+        if line.strip():
+            yield line
+
+
+def csv_rows(file):
+    return csv.DictReader(file)
+
+
+READERS = {
+    'jsonl': jsonl_rows,
+    'csv': csv_rows,
+}
+
+
+def _fields(row):
+    """Поля записи: строки JSONL разбираются, строки CSV уже словари."""
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError:
+            raise InvalidRow('некорректный JSON')
+    if not isinstance(row, dict):
+        raise InvalidRow('ожидался объект')
+    return row
+
+
+def _value(row, name, required=True):
+    value = row.get(name)
+    if value is None or value == '':
+        if required:
+            raise InvalidRow(f'нет поля {name}')
+        return None
+    return str(value)
+
+
+def _id(row, name, required=True):
+    value = _value(row, name, required)
+    if value is None:
+        return None
+    if not value.isdigit() or not int(value):
+        raise InvalidRow(f'{name}: ожидался положительный id')
+    return int(value)
+
+
+def _date(row, name):
+    value = _value(row, name, required=False)
+    if value is None:
+        return timezone.now()
+    try:
+        date = parse_datetime(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise InvalidRow(f'{name}: ожидалась дата ISO 8601')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _positive_ids(values):
+    return {int(value) for value in values
+            if str(value).isdigit() and int(value)}
+
+
+class Lookups:
+    """Карты id пользователей, групп и постов для проверки записей."""
+
+    def __init__(self, create_users=False):
+        self.create_users = create_users
+        self.users = dict(
+            User.objects.values_list('username', 'pk').iterator())
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.posts = set()
+        self.existing = set()
+
+    def user(self, username):
+        if username not in self.users:
+            raise InvalidRow(f'неизвестный пользователь {username}')
+        return self.users[username]
+
+    def group(self, slug):
+        if slug is None:
+            return None
+        if slug not in self.groups:
+            raise InvalidRow(f'неизвестная группа {slug}')
+        return self.groups[slug]
+
+    def post(self, post_id):
+        if post_id not in self.posts:
+            raise InvalidRow(f'неизвестный пост {post_id}')
+        return post_id
+
+    def new(self, key, reason):
+        """Отклоняет запись, уже существующую в базе или в порции."""
+        if key in self.existing:
+            raise InvalidRow(reason)
+        self.existing.add(key)
+        return key
+
+    def prepare(self, kind, rows):
+        """Загружает посты и существующие записи порции.
+
+        Новые пользователи порции создаются до поиска её подписок.
+        """
+        if kind.model is Comment:
+            self.posts = set(Post.objects.filter(
+                pk__in=_positive_ids(row.get('post') for row in rows),
+            ).values_list('pk', flat=True))
+        if self.create_users:
+            self._create_users({
+                str(row[field]) for row in rows for field in kind.users
+                if row.get(field) not in (None, '')
+            } - self.users.keys())
+        if kind.model is Post:
+            self.existing = set(Post.objects.filter(
+                pk__in=_positive_ids(row.get('id') for row in rows),
+            ).values_list('pk', flat=True))
+        elif kind.model is Follow:
+            user_ids = {
+                self.users.get(str(row.get(field)))
+                for row in rows for field in kind.users
+            } - {None}
+            self.existing = set(Follow.objects.filter(
+                user_id__in=user_ids, author_id__in=user_ids,
+            ).values_list('user_id', 'author_id'))
+
+    def _create_users(self, usernames):
+        valid = []
+        for username in usernames:
+            try:
+                User._meta.get_field('username').run_validators(username)
+            except ValidationError:
+                continue
+            valid.append(username)
+        # Пароль непригоден для входа: его задают через восстановление.
+        User.objects.bulk_create(
+            User(username=username, password=make_password(None))
+            for username in valid)
+        self.users.update(User.objects.filter(
+            username__in=valid).values_list('username', 'pk'))
+
+
+def _post(row, lookups):
+    pub_date = _date(row, 'pub_date')
+    image = _value(row, 'image', required=False) or ''
+    if len(image) > Post._meta.get_field('image').max_length:
+        raise InvalidRow('image: слишком длинное имя файла')
+    post = Post(
+        pk=_id(row, 'id', required=False),
+        text=_value(row, 'text'),
+        author_id=lookups.user(_value(row, 'author')),
+        group_id=lookups.group(_value(row, 'group', required=False)),
+        image=image,
+        pub_date=pub_date,
+        updated=pub_date,
+    )
+    if post.pk is not None:
+        lookups.new(post.pk, 'пост с таким id уже есть')
+    return post
+
+
+def _comment(row, lookups):
+    return Comment(
+        post_id=lookups.post(_id(row, 'post')),
+        author_id=lookups.user(_value(row, 'author')),
+        text=_value(row, 'text'),
+        created=_date(row, 'created'),
+    )
+
+
+def _follow(row, lookups):
+    user_id = lookups.user(_value(row, 'user'))
+    author_id = lookups.user(_value(row, 'author'))
+    if user_id == author_id:
+        raise InvalidRow('подписка на самого себя')
+    lookups.new((user_id, author_id), 'подписка уже есть')
+    return Follow(user_id=user_id, author_id=author_id)
+
+
+def _invalidate_follows(follows):
+    page_cache.bump(*{scopes.follows(follow.user_id) for follow in follows})
+
+
+Kind = namedtuple('Kind', 'model build users invalidate')
+
+KINDS = {
+    ImportCheckpoint.POSTS: Kind(Post, _post, ('author',), None),
+    ImportCheckpoint.COMMENTS: Kind(Comment, _comment, ('author',), None),
+    ImportCheckpoint.FOLLOWS: Kind(
+        Follow, _follow, ('user', 'author'), _invalidate_follows),
+}
+
+
+@contextmanager
+def dates_from_file():
+    """Отключает ``auto_now`` и ``auto_now_add`` у полей дат моделей."""
+    fields = [Post._meta.get_field('pub_date'),
+              Post._meta.get_field('updated'),
+              Comment._meta.get_field('created')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _checked(rows, function):
+    """Применяет ``function`` к парам (номер, запись), собирая ошибки."""
+    results, errors = [], []
+    for number, row in rows:
+        try:
+            results.append((number, function(row)))
+        except InvalidRow as error:
+            errors.append((number, str(error)))
+    return results, errors
+
+
+def _build(kind, rows, lookups):
+    rows, errors = _checked(rows, _fields)
+    lookups.prepare(kind, [row for _, row in rows])
+    objects, invalid = _checked(
+        rows, lambda row: kind.build(row, lookups))
+    return [obj for _, obj in objects], sorted(errors + invalid)
+
+
+def run(checkpoint, rows, create_users=False, progress=None, errors=None):
+    """Импортирует записи ``rows`` с места остановки ``checkpoint``.
+
+    ``progress`` вызывается после каждой порции с обновлённой отметкой,
+    ``errors`` — для каждой пропущенной записи с её номером и причиной.
+    """
+    kind = KINDS[checkpoint.kind]
+    lookups = Lookups(create_users)
+    rows = islice(rows, checkpoint.rows, None)
+    with dates_from_file():
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            numbered = enumerate(chunk, checkpoint.rows + 1)
+            with transaction.atomic():
+                objects, rejected = _build(kind, numbered, lookups)
+                kind.model.objects.bulk_create(objects)
+                checkpoint.rows += len(chunk)
+                checkpoint.imported += len(objects)
+                checkpoint.skipped += len(rejected)
+                checkpoint.save(
+                    update_fields=['rows', 'imported', 'skipped'])
+            if kind.invalidate is not None:
+                kind.invalidate(objects)
+            if errors is not None:
+                for number, message in rejected:
+                    errors(number, message)
+            if progress is not None:
+                progress(checkpoint)
+    return checkpoint
+
+
+def rebuild(kind):
+    """Пересчитывает данные, которые ведут сигналы, после импорта ``kind``."""
+    counters.reconcile()
+    if kind == ImportCheckpoint.POSTS:
+        counters.reconcile_blobs()
+    if kind != ImportCheckpoint.COMMENTS:
+        timeline.rebuild()
+    page_cache.bump(scopes.FEED, scopes.GROUPS)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок по существующим подпискам и постам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя; можно указать несколько раз.')
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Очистить ленты перед заполнением.')
+
+    def handle(self, *args, user_ids=None, reset=False, **options):
+        added = timeline.rebuild(user_ids=user_ids, reset=reset)
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено записей в ленты: {added}'))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «на кого подписаться» по всему графу '
+        'подписок. Нужен NumPy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=recommendations.BATCH_SIZE,
+            help='Пользователей в одной векторной пачке.')
+        parser.add_argument(
+            '--top', type=int, default=recommendations.TOP_K,
+            help='Рекомендаций на пользователя.')
+
+    def handle(self, *args, batch_size, top, **options):
+        started = time.monotonic()
+        try:
+            graph = recommendations.FollowGraph.load()
+        except recommendations.NumpyRequired:
+            raise CommandError('Установите NumPy: pip install numpy')
+        loaded = time.monotonic() - started
+        self.stdout.write(
+            f'Граф: {graph.size} вершин, {graph.edges} рёбер, '
+            f'{graph.nbytes / 2 ** 20:.1f} МиБ, загружен за {loaded:.1f} с')
+        started = time.monotonic()
+
+        def progress(done, total, written):
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed else 0.0
+            self.stdout.write(
+                f'{done}/{total} пользователей ({done * 100 // total}%), '
+                f'рекомендаций: {written}, {rate:.0f} польз./с')
+
+        written = recommendations.rebuild(
+            graph, batch_size=batch_size, top_k=top, progress=progress)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано рекомендаций: {written} за {elapsed:.1f} с'))
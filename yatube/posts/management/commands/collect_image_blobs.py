@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import delete as delete_thumbnails
+
+from posts import thumbnails
+from posts.models import ImageBlob, Post
+
+DEFAULT_GRACE = 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы изображений, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=DEFAULT_GRACE,
+            help='Не трогать файлы, изменённые за последние N секунд.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.')
+
+    def handle(self, *args, grace, dry_run, **options):
+        storage = Post._meta.get_field('image').storage
+        deadline = time.time() - grace
+        removed = kept = 0
+        for blob in ImageBlob.objects.filter(refcount=0).iterator():
+            path = storage.path(blob.name)
+            if Post.objects.filter(image=blob.name).exists():
+                # Счётчик разошёлся с постами: файл ещё нужен.
+                ImageBlob.objects.filter(pk=blob.pk).update(
+                    refcount=Post.objects.filter(image=blob.name).count())
+                kept += 1
+                continue
+            if os.path.exists(path) and os.path.getmtime(path) > deadline:
+                kept += 1
+                continue
+            self.stdout.write(blob.name)
+            if not dry_run:
+                thumbnails.forget_pictures(blob.name)
+                delete_thumbnails(thumbnails.source_file(blob.name))
+                blob.delete()
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {removed}, оставлено: {kept}'))
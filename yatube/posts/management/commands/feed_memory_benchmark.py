@@ -0,0 +1,80 @@
+import inspect
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from posts import views
+from posts.models import Group, Post
+
+User = get_user_model()
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000, 1000000)
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет пиковую память при выводе страниц группы и профиля '
+        'по мере роста числа постов. Данные создаются во временной '
+        'транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+            help='Число постов в группе на каждом шаге.')
+
+    def handle(self, *args, sizes, **options):
+        with transaction.atomic():
+            self.run(sorted(sizes))
+            transaction.set_rollback(True)
+
+    def run(self, sizes):
+        author = User.objects.create_user(username='feed-benchmark')
+        group = Group.objects.create(
+            title='Бенчмарк', slug='feed-bench', description='')
+        self.measure(views.group_posts, slug=group.slug)
+        self.stdout.write(
+            f'{"постов":>10} {"группа, КиБ":>12} {"профиль, КиБ":>13} '
+            f'{"запросов":>9} {"время, мс":>10}')
+        created = 0
+        for size in sizes:
+            while created < size:
+                batch = min(BATCH_SIZE, size - created)
+                Post.objects.bulk_create(
+                    Post(text=f'Пост {created + i}', author=author,
+                         group=group)
+                    for i in range(batch))
+                created += batch
+            group_peak, queries, elapsed = self.measure(
+                views.group_posts, slug=group.slug)
+            profile_peak, _, _ = self.measure(
+                views.profile, username=author.username)
+            self.stdout.write(
+                f'{size:>10} {group_peak / 1024:>12.1f} '
+                f'{profile_peak / 1024:>13.1f} {queries:>9} '
+                f'{elapsed * 1000:>10.1f}')
+
+    def measure(self, view, **kwargs):
+        """Пиковая память, число запросов и время одного вывода страницы.
+
+        Кеш страниц и условные ответы снимаются: иначе после первого
+        вывода все размеры отдаются из кеша без запросов.
+        """
+        view = inspect.unwrap(view)
+        request = RequestFactory().get('/', {'page': 2})
+        request.user = AnonymousUser()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            view(request, **kwargs)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak, len(queries), elapsed
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры всех размеров для уже загруженных изображений. '
+        'Можно запускать в нескольких процессах: файл, который обрабатывает '
+        'другой процесс, пропускается.'
+    )
+
+    def handle(self, *args, **options):
+        sources = (
+            Post.objects.exclude(image='')
+            .order_by().values_list('image', flat=True).distinct()
+        )
+        generated = skipped = failed = 0
+        for source in sources.iterator():
+            try:
+                if thumbnails.generate(source):
+                    generated += 1
+                else:
+                    skipped += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{source}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано: {generated}, занято другим процессом: {skipped}, '
+            f'ошибок: {failed}'))
@@ -0,0 +1,90 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import importer
+from posts.models import ImportCheckpoint
+
+REPORT_INTERVAL = 5
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты, комментарии или подписки из файла JSONL или CSV '
+        'без сигналов и пересчитывает производные данные. Прерванный импорт '
+        'того же файла продолжается с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kind', choices=list(importer.KINDS),
+            help='Что содержит файл.')
+        parser.add_argument('path', help='Путь к файлу.')
+        parser.add_argument(
+            '--format', choices=list(importer.READERS),
+            help='Формат файла; по умолчанию определяется по расширению.')
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных пользователей с непригодным '
+                 'для входа паролем.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Забыть место остановки и импортировать файл заново.')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счётчики и ленты, например перед '
+                 'импортом следующего файла. Потом запустите '
+                 'reconcile_counters и backfill_timelines.')
+
+    def handle(self, *args, kind, path, **options):
+        source = os.path.abspath(path)
+        if options['restart']:
+            ImportCheckpoint.objects.filter(
+                source=source, kind=kind).delete()
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            source=source, kind=kind)
+        if checkpoint.finished:
+            raise CommandError(
+                f'{path} уже импортирован; --restart, чтобы начать заново')
+        if checkpoint.rows:
+            self.stdout.write(
+                f'Продолжение с записи {checkpoint.rows + 1}')
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        self.started = self.reported = time.monotonic()
+        self.first_row = checkpoint.rows
+        with open(path, encoding='utf-8', newline='') as file:
+            importer.run(
+                checkpoint, importer.READERS[file_format](file),
+                create_users=options['create_users'],
+                progress=self.progress, errors=self.error)
+        self.report(checkpoint)
+        if not options['no_rebuild']:
+            started = time.monotonic()
+            importer.rebuild(kind)
+            self.stdout.write(
+                f'Производные данные пересчитаны за '
+                f'{time.monotonic() - started:.1f} с')
+        checkpoint.finished = timezone.now()
+        checkpoint.save(update_fields=['finished'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано: {checkpoint.imported}, '
+            f'пропущено: {checkpoint.skipped}'))
+
+    def error(self, number, message):
+        self.stderr.write(f'запись {number}: {message}')
+
+    def progress(self, checkpoint):
+        if time.monotonic() - self.reported >= REPORT_INTERVAL:
+            self.report(checkpoint)
+
+    def report(self, checkpoint):
+        self.reported = time.monotonic()
+        elapsed = self.reported - self.started
+        rows = checkpoint.rows - self.first_row
+        rate = rows / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f'{checkpoint.rows} записей, записано {checkpoint.imported}, '
+            f'пропущено {checkpoint.skipped}, {rate:.0f} записей/с')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересоздаёт триггеры полнотекстового индекса постов и заново '
+        'наполняет индекс.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            search.rebuild(cursor)
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
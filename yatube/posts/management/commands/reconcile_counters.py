@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев, подписок и ссылок '
+        'на файлы изображений.'
+    )
+
+    def handle(self, *args, **options):
+        counters.reconcile()
+        counters.reconcile_blobs()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
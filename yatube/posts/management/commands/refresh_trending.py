@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает списки популярных постов сайта и групп. Страницы '
+        'популярного делают это сами раз в несколько минут; команду можно '
+        'запускать по расписанию, чтобы пересчёт не выпадал на запрос.'
+    )
+
+    def handle(self, *args, **options):
+        lists = trending.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярных постов: {len(lists["site"])}, '
+            f'групп со списками: {len(lists["groups"])}'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет массовые действия из админки из очереди и прерванные '
+        'перезапуском сервера (с истёкшей арендой) с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--failed', action='store_true',
+            help='Повторить и задания, завершившиеся ошибкой.')
+
+    def handle(self, *args, **options):
+        jobs = bulk.claimable(options['failed']).order_by('pk')
+        for job_id in jobs.values_list('pk', flat=True):
+            job = bulk.run(job_id, retry_failed=options['failed'])
+            self.stdout.write(
+                f'{job}: обработано {job.processed} из {job.total}')
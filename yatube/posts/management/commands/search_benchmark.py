@@ -0,0 +1,84 @@
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import SearchPaginator
+
+User = get_user_model()
+
+DEFAULT_ROWS = 2000000
+BATCH_SIZE = 5000
+WORDS_PER_POST = 20
+VOCABULARY_SIZE = 50000
+SYLLABLES = ('ка', 'ло', 'ми', 'ра', 'ту', 'не', 'зо', 'ви', 'да', 'шу')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по полнотекстовому индексу с LIKE-сканированием '
+        'на синтетическом корпусе. Данные создаются во временной '
+        'транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=DEFAULT_ROWS,
+            help='Число постов в корпусе.')
+        parser.add_argument(
+            '--queries', type=int, default=5,
+            help='Число запросов разной частоты.')
+
+    def handle(self, *args, rows, queries, **options):
+        with transaction.atomic():
+            self.run(rows, queries)
+            transaction.set_rollback(True)
+
+    def run(self, rows, queries):
+        generator = random.Random(0)
+        vocabulary = sorted({
+            ''.join(generator.choices(SYLLABLES, k=4))
+            for _ in range(VOCABULARY_SIZE)
+        })
+        # Частота слов по закону Ципфа, как в живом тексте.
+        weights = list(accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)))
+        author = User.objects.create_user(username='search-benchmark')
+        started = time.perf_counter()
+        created = 0
+        while created < rows:
+            batch = min(BATCH_SIZE, rows - created)
+            Post.objects.bulk_create(
+                Post(author=author, text=' '.join(generator.choices(
+                    vocabulary, cum_weights=weights, k=WORDS_PER_POST)))
+                for _ in range(batch))
+            created += batch
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Загружено {rows} постов за {elapsed:.1f} с '
+            f'({rows / elapsed:.0f} строк/с)')
+        self.stdout.write(
+            f'{"слово":>10} {"FTS, мс":>9} {"LIKE, мс":>10} '
+            f'{"след. стр., мс":>15}')
+        step = max(1, len(vocabulary) // queries)
+        for word in vocabulary[::step][:queries]:
+            paginator = SearchPaginator(word, 10)
+            fts, page = self.measure(paginator.page)
+            like, _ = self.measure(lambda: list(
+                Post.objects.filter(text__icontains=word)[:10]))
+            following = 0.0
+            if page.has_next():
+                following, _ = self.measure(
+                    lambda: paginator.page(after=page.next_cursor))
+            self.stdout.write(
+                f'{word:>10} {fts * 1000:>9.1f} {like * 1000:>10.1f} '
+                f'{following * 1000:>15.1f}')
+
+    def measure(self, function):
+        started = time.perf_counter()
+        result = function()
+        return time.perf_counter() - started, result
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:53
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(model, field):
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(
+        Subquery(rows.annotate(total=Count('pk')).values('total')), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = (
+        Follow.objects.values('user', 'author').order_by()
+        .annotate(first=Min('pk'), total=Count('pk')).filter(total__gt=1)
+    )
+    removed = 0
+    for pair in list(duplicates):
+        removed += Follow.objects.filter(
+            user=pair['user'], author=pair['author'],
+        ).exclude(pk=pair['first']).delete()[0]
+    if removed:
+        # Дубликаты учитывались в счётчиках подписок.
+        UserStats = apps.get_model('posts', 'UserStats')
+        UserStats.objects.update(
+            followers_count=count(Follow, 'author'),
+            following_count=count(Follow, 'user'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_comment_post_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+FTS_TABLE = 'posts_post_fts'
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': (
+        'AFTER INSERT ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+    f'{FTS_TABLE}_delete': (
+        'AFTER DELETE ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        'END'
+    ),
+    f'{FTS_TABLE}_update': (
+        'AFTER UPDATE OF text ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+}
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite пересоздаёт таблицу постов при добавлении поля, а вместе со
+    # старой таблицей пропадают триггеры полнотекстового индекса.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name, body in TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'CREATE TRIGGER {name} {body}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_trending_buckets'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число просмотров'),
+        ),
+        migrations.RunPython(
+            restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_views_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Файл')),
+                ('kind', models.CharField(choices=[('posts', 'Посты'), ('comments', 'Комментарии'), ('follows', 'Подписки')], max_length=10, verbose_name='Данные')),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Прочитано строк')),
+                ('imported', models.PositiveIntegerField(default=0, verbose_name='Записано')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='Пропущено')),
+                ('started', models.DateTimeField(auto_now_add=True, verbose_name='Начат')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершён')),
+            ],
+            options={
+                'verbose_name': 'Импорт',
+                'verbose_name_plural': 'Импорт',
+                'ordering': ['-started'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importcheckpoint',
+            constraint=models.UniqueConstraint(fields=('source', 'kind'), name='unique_import_checkpoint'),
+        ),
+    ]
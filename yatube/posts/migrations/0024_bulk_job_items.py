@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:23
+
+import pickle
+
+from django.db import migrations, models
+from django.db.models.query import QuerySet
+import django.db.models.deletion
+
+
+def store_job_items(apps, schema_editor):
+    # Незавершённые задания получают выборку из сохранённого запроса.
+    BulkJob = apps.get_model('posts', 'BulkJob')
+    BulkJobItem = apps.get_model('posts', 'BulkJobItem')
+    jobs = BulkJob.objects.exclude(status='done')
+    for job in jobs.iterator():
+        query = pickle.loads(job.query)
+        post_ids = QuerySet(model=query.model, query=query).order_by(
+        ).values_list('pk', flat=True)
+        BulkJobItem.objects.bulk_create(
+            (BulkJobItem(job=job, post_id=post_id)
+             for post_id in post_ids.iterator()),
+            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_timeline_post_key_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkjob',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Занято обработчиком до'),
+        ),
+        migrations.CreateModel(
+            name='BulkJobItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.PositiveIntegerField(verbose_name='id поста')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='posts.BulkJob', verbose_name='Задание')),
+            ],
+            options={
+                'verbose_name': 'Пост массового действия',
+                'verbose_name_plural': 'Посты массовых действий',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bulkjobitem',
+            constraint=models.UniqueConstraint(fields=('job', 'post_id'), name='unique_bulk_job_item'),
+        ),
+        migrations.RunPython(store_job_items, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='bulkjob',
+            name='query',
+        ),
+    ]
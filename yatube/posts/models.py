@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -10,6 +12,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=10, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
 
     def __str__(self):
         return self.title
@@ -20,6 +23,7 @@ class Post(models.Model):
 
     text = models.TextField('Текст поста', help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -36,18 +40,53 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0)
+    views_count = models.PositiveIntegerField('Число просмотров', default=0)
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+class UserStats(models.Model):
+    """Счётчики пользователя, поддерживаемые сигналами."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
 class Comment(models.Model):
     """Модель комментария. Порядок вывода по убыванию даты."""
 
@@ -69,9 +108,13 @@ class Comment(models.Model):
     created = models.DateTimeField('Дата публикации', auto_now_add=True)
 
     class Meta:
-        ordering = ['-created']
+        ordering = ['-created', '-id']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -93,6 +136,280 @@ class Follow(models.Model):
         verbose_name='Автор'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
     def __str__(self):
         name = f'{self.user}-{self.author}'
         return name
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора во «входящих» подписчика."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ['-pub_date', '-id']
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_post_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}-{self.post_id}'
+
+
+class PulledAuthor(models.Model):
+    """Автор с большим числом подписчиков.
+
+    Его посты не раскладываются во входящие, а подмешиваются в ленту
+    подписок при чтении. Отметка не снимается сама, чтобы посты,
+    опубликованные в этом режиме, не пропали из лент.
+    """
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='pulled_timeline',
+        verbose_name='Автор'
+    )
+    since = models.DateTimeField('Читается при запросе с', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Автор без раскладки постов'
+        verbose_name_plural = 'Авторы без раскладки постов'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class ImageBlob(models.Model):
+    """Файл изображения в хранилище по содержимому.
+
+    ``refcount`` — число постов с этим файлом; файлы без ссылок удаляет
+    команда ``collect_image_blobs``.
+    """
+
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    refcount = models.PositiveIntegerField('Число постов', default=0)
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return self.name
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендация подписки, рассчитанная офлайн.
+
+    Таблицу целиком переписывает команда ``build_follow_suggestions``.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ['user', '-score']
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}-{self.author}'
+
+
+class TrendingBucket(models.Model):
+    """Очки популярности поста за один час (см. ``posts.trending``)."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост'
+    )
+    group = models.ForeignKey(
+        Group, blank=True, null=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name='Группа'
+    )
+    bucket = models.PositiveIntegerField('Час с начала эпохи')
+    points = models.PositiveIntegerField('Очки', default=0)
+
+    class Meta:
+        verbose_name = 'Очки популярности'
+        verbose_name_plural = 'Очки популярности'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'bucket'],
+                                    name='unique_trending_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket'], name='trending_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}@{self.bucket}'
+
+
+class BulkJob(models.Model):
+    """Массовое действие над постами, выполняемое в фоне порциями."""
+
+    DELETE = 'delete'
+    MOVE = 'move'
+    ACTIONS = (
+        (DELETE, 'Удаление'),
+        (MOVE, 'Перенос в группу'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User, blank=True, null=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name='Запустил'
+    )
+    action = models.CharField('Действие', max_length=10, choices=ACTIONS)
+    group = models.ForeignKey(
+        Group, blank=True, null=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name='Группа'
+    )
+    total = models.PositiveIntegerField('Постов в выборке', default=0)
+    processed = models.PositiveIntegerField('Обработано', default=0)
+    last_pk = models.PositiveIntegerField('Последний id', default=0)
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=PENDING)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    finished = models.DateTimeField('Завершено', blank=True, null=True)
+    lease_until = models.DateTimeField(
+        'Занято обработчиком до', blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Массовое действие'
+        verbose_name_plural = 'Массовые действия'
+
+    def __str__(self):
+        return f'{self.get_action_display()} #{self.pk}'
+
+    @property
+    def progress(self):
+        """Доля обработанных постов в процентах."""
+        if not self.total:
+            return 100 if self.status == self.DONE else 0
+        return min(100, self.processed * 100 // self.total)
+
+
+class BulkJobItem(models.Model):
+    """Пост выборки массового действия, записанный при его запуске."""
+
+    job = models.ForeignKey(
+        BulkJob,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Задание'
+    )
+    # Не внешний ключ: удаление поста не должно менять выборку.
+    post_id = models.PositiveIntegerField('id поста')
+
+    class Meta:
+        verbose_name = 'Пост массового действия'
+        verbose_name_plural = 'Посты массовых действий'
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'post_id'],
+                                    name='unique_bulk_job_item'),
+        ]
+
+    def __str__(self):
+        return f'{self.job_id}:{self.post_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """Место остановки импорта файла командой ``import_content``.
+
+    Обновляется в той же транзакции, что и записанная порция строк,
+    поэтому повторный запуск продолжает импорт без пропусков и повторов.
+    """
+
+    POSTS = 'posts'
+    COMMENTS = 'comments'
+    FOLLOWS = 'follows'
+    KINDS = (
+        (POSTS, 'Посты'),
+        (COMMENTS, 'Комментарии'),
+        (FOLLOWS, 'Подписки'),
+    )
+
+    source = models.CharField('Файл', max_length=255)
+    kind = models.CharField('Данные', max_length=10, choices=KINDS)
+    rows = models.PositiveIntegerField('Прочитано строк', default=0)
+    imported = models.PositiveIntegerField('Записано', default=0)
+    skipped = models.PositiveIntegerField('Пропущено', default=0)
+    started = models.DateTimeField('Начат', auto_now_add=True)
+    finished = models.DateTimeField('Завершён', blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started']
+        verbose_name = 'Импорт'
+        verbose_name_plural = 'Импорт'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'kind'],
+                                    name='unique_import_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.source}'
@@ -0,0 +1,201 @@
+"""Курсорная (keyset) пагинация лент.
+
+Страница выбирается не через OFFSET, а по условию на последнюю увиденную
+запись: ``(pub_date, id) < (последняя pub_date, последний id)``. Такой запрос
+идёт по составному индексу и стоит одинаково на любой глубине ленты,
+а COUNT(*) не выполняется вовсе.
+"""
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+CURSOR_SEPARATOR = '|'
+POST_ORDERING = ('-pub_date', '-id')
+MAX_PAGE_NUMBER = 10
+
+
+class InvalidCursor(Exception):
+    """Токен курсора повреждён или не подходит к сортировке."""
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    raw = CURSOR_SEPARATOR.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_values(token, size):
+    """Распаковывает токен в ``size`` строковых значений."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(token)
+    parts = raw.split(CURSOR_SEPARATOR)
+    if len(parts) != size:
+        raise InvalidCursor(token)
+    return parts
+
+
+def decode_cursor(token, model, ordering):
+    """Распаковывает токен обратно в значения полей ``ordering``."""
+    parts = decode_values(token, len(ordering))
+    values = []
+    for name, part in zip(ordering, parts):
+        field = model._meta.get_field(name.lstrip('-'))
+        try:
+            values.append(field.to_python(part))
+        except ValidationError:
+            raise InvalidCursor(token)
+    return values
+
+
+def keyset_filter(ordering, values, forward):
+    """Строит условие «строго после» (или «строго до») заданного ключа."""
+    condition = Q()
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        descending = name.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def reverse_ordering(ordering):
+    return tuple(
+        name[1:] if name.startswith('-') else f'-{name}' for name in ordering
+    )
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации с интерфейсом, похожим на ``Page``."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous, paginator):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if has_next and object_list:
+            self.next_cursor = paginator.cursor_for(object_list[-1])
+        if has_previous and object_list:
+            self.previous_cursor = paginator.cursor_for(object_list[0])
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class _PagesAhead(Paginator):
+    """``Paginator`` для ``as_page``: число страниц известно до текущей
+    и ещё на одну вперёд, если она есть. ``count`` — записи на руках,
+    поэтому COUNT(*) не выполняется.
+    """
+
+    def __init__(self, object_list, per_page, number, has_next):
+        super().__init__(object_list, per_page)
+        self.count = len(object_list)
+        self.num_pages = number + 1 if has_next else number
+
+
+def as_page(page, number=1):
+    """``CursorPage`` в виде ``Page`` Django с номером ``number``.
+
+    Годится коду, который ждёт ``Page``; общее число записей неизвестно,
+    поэтому COUNT(*) не выполняется, а дальше лента идёт по курсорам.
+    """
+    result = Page(page.object_list, number, _PagesAhead(
+        page.object_list, page.paginator.per_page, number, page.has_next()))
+    result.is_cursor = True
+    result.next_cursor = page.next_cursor
+    result.previous_cursor = page.previous_cursor
+    return result
+
+
+class BaseCursorPaginator:
+    """Основа курсорных пагинаторов; метод ``page`` задаёт подкласс."""
+
+    def get_page(self, **tokens):
+        """Как ``page``, но битый токен даёт первую страницу."""
+        try:
+            return self.page(**tokens)
+        except InvalidCursor:
+            return self.page()
+
+
+class CursorPaginator(BaseCursorPaginator):
+    """Пагинатор по ключу ``ordering`` без OFFSET и COUNT(*)."""
+
+    def __init__(self, object_list, per_page, ordering=POST_ORDERING):
+        self.ordering = tuple(ordering)
+        self.object_list = object_list.order_by(*self.ordering)
+        self.per_page = int(per_page)
+
+    def cursor_for(self, obj):
+        """Токен, указывающий на позицию ``obj`` в ленте."""
+        return encode_cursor(
+            getattr(obj, name.lstrip('-')) for name in self.ordering)
+
+    def page(self, after=None, before=None):
+        """Страница после токена ``after`` или перед токеном ``before``."""
+        model = self.object_list.model
+        if before:
+            values = decode_cursor(before, model, self.ordering)
+            queryset = self.object_list.filter(
+                keyset_filter(self.ordering, values, forward=False)
+            ).order_by(*reverse_ordering(self.ordering))
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return CursorPage(rows, True, has_previous, self)
+        queryset = self.object_list
+        if after:
+            values = decode_cursor(after, model, self.ordering)
+            queryset = queryset.filter(
+                keyset_filter(self.ordering, values, forward=True))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], has_next, bool(after), self)
+
+    def numbered_page(self, number=None):
+        """Страница по номеру из ссылок вида ``?page=N``.
+
+        Номер не больше ``MAX_PAGE_NUMBER``, так что OFFSET остаётся
+        коротким; о следующей странице говорит лишняя запись, а не
+        COUNT(*). Номер за концом ленты даёт первую страницу.
+        """
+        try:
+            number = min(max(int(number), 1), MAX_PAGE_NUMBER)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(self.object_list[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            return self.numbered_page()
+        has_next = len(rows) > self.per_page
+        page = CursorPage(rows[:self.per_page], has_next, number > 1, self)
+        return as_page(page, number)
@@ -0,0 +1,181 @@
+"""Рекомендации «на кого подписаться», рассчитываемые офлайн.
+
+Граф подписок целиком загружается в память в виде двух CSR-структур
+NumPy: исходящие рёбра (на кого подписан пользователь) и входящие
+(кто подписан на автора). Каждое — массив смещений ``indptr`` и массив
+соседей ``indices`` с плотными номерами вершин, по 4 байта на ребро.
+
+Кандидаты для пачки пользователей считаются векторно:
+
+* друзья друзей — авторы, на которых подписаны те, на кого подписан
+  пользователь (два шага по исходящим рёбрам);
+* совместные подписки — авторы, на которых подписаны другие подписчики
+  тех же авторов (шаг по исходящим, шаг по входящим и снова по
+  исходящим).
+
+На каждом шаге после первого у вершины берутся только ``SAMPLE``
+соседей: иначе один популярный автор или пользователь с тысячами
+подписок раздувает пачку.
+
+Из кандидатов убираются сам пользователь и те, на кого он уже подписан,
+а лучшие ``TOP_K`` записываются в ``FollowSuggestion``; виджет ленты
+читает только эту таблицу. NumPy указан в зависимостях проекта, но
+импортируется мягко: без него сайт работает, а команда расчёта сообщает,
+что его нужно установить.
+"""
+from itertools import chain, islice
+
+from django.db import transaction
+
+from .models import Follow, FollowSuggestion
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TOP_K = 10
+BATCH_SIZE = 1024
+LOAD_CHUNK_SIZE = 100000
+SAMPLE = 100
+FRIENDS_OF_FRIENDS_WEIGHT = 1.0
+COFOLLOW_WEIGHT = 0.25
+
+
+class NumpyRequired(Exception):
+    """Для расчёта рекомендаций нужен NumPy."""
+
+
+class Adjacency:
+    """Строки разреженной матрицы смежности в формате CSR."""
+
+    def __init__(self, rows, columns, size):
+        order = np.argsort(rows, kind='stable')
+        self.indices = columns[order]
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=self.indptr[1:])
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.indptr.nbytes
+
+    def expand(self, rows, limit=None):
+        """Соседи строк ``rows``.
+
+        Возвращает пару массивов: номер строки в ``rows`` и соседа. При
+        ``limit`` у каждой строки берутся только первые ``limit`` соседей.
+        """
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        if limit is not None:
+            lengths = np.minimum(lengths, limit)
+        owners = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths)
+        return owners, self.indices[np.repeat(starts, lengths) + offsets]
+
+
+class FollowGraph:
+    """Граф подписок: плотные номера вершин и рёбра в обе стороны."""
+
+    def __init__(self, followers, authors):
+        self.ids, dense = np.unique(
+            np.concatenate([followers, authors]), return_inverse=True)
+        dense = dense.astype(np.int32)
+        users, targets = dense[:len(followers)], dense[len(followers):]
+        self.size = len(self.ids)
+        self.edges = len(followers)
+        self.following = Adjacency(users, targets, self.size)
+        self.followers = Adjacency(targets, users, self.size)
+
+    @classmethod
+    def load(cls):
+        """Читает ``Follow`` порциями, не создавая объектов моделей."""
+        if np is None:
+            raise NumpyRequired
+        pairs = Follow.objects.order_by().values_list('user_id', 'author_id')
+        chunks = []
+        iterator = pairs.iterator(chunk_size=LOAD_CHUNK_SIZE)
+        while True:
+            chunk = np.fromiter(
+                chain.from_iterable(islice(iterator, LOAD_CHUNK_SIZE)),
+                dtype=np.int64)
+            if not len(chunk):
+                break
+            chunks.append(chunk.reshape(-1, 2))
+        edges = (np.concatenate(chunks) if chunks
+                 else np.empty((0, 2), dtype=np.int64))
+        return cls(edges[:, 0], edges[:, 1])
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.following.nbytes + self.followers.nbytes
+
+    def suggest(self, rows, top_k=TOP_K):
+        """Лучшие кандидаты для вершин ``rows``.
+
+        Возвращает три массива: номер в ``rows``, кандидата и его оценку,
+        не больше ``top_k`` кандидатов на вершину.
+        """
+        owners, followed = self.following.expand(rows)
+        # Друзья друзей.
+        hop, candidates = self.following.expand(followed, SAMPLE)
+        keys = [owners[hop] * self.size + candidates]
+        weights = [np.full(len(hop), FRIENDS_OF_FRIENDS_WEIGHT)]
+        # Совместные подписки.
+        hop, peers = self.followers.expand(followed, SAMPLE)
+        peer_owners = owners[hop]
+        hop, candidates = self.following.expand(peers, SAMPLE)
+        keys.append(peer_owners[hop] * self.size + candidates)
+        weights.append(np.full(len(hop), COFOLLOW_WEIGHT))
+
+        keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        known = np.concatenate([
+            owners * self.size + followed,
+            np.arange(len(rows)) * self.size + rows,
+        ])
+        fresh = ~np.isin(keys, known)
+        keys, scores = keys[fresh], scores[fresh]
+        owners, candidates = keys // self.size, keys % self.size
+        order = np.lexsort((candidates, -scores, owners))
+        owners, candidates, scores = (
+            owners[order], candidates[order], scores[order])
+        first = np.searchsorted(owners, owners)
+        best = np.arange(len(owners)) - first < top_k
+        return owners[best], candidates[best], scores[best]
+
+
+def _save(graph, rows, owners, candidates, scores):
+    user_ids = graph.ids[rows]
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids.tolist()).delete()
+        FollowSuggestion.objects.bulk_create(
+            FollowSuggestion(user_id=int(user_id), author_id=int(author_id),
+                             score=float(score))
+            for user_id, author_id, score in zip(
+                user_ids[owners], graph.ids[candidates], scores))
+
+
+def rebuild(graph=None, batch_size=BATCH_SIZE, top_k=TOP_K, progress=None):
+    """Пересчитывает рекомендации всех пользователей с подписками.
+
+    ``progress`` вызывается после каждой пачки с числом обработанных
+    пользователей, их общим числом и числом записанных рекомендаций.
+    Возвращает число записанных рекомендаций.
+    """
+    if graph is None:
+        graph = FollowGraph.load()
+    with_follows = np.flatnonzero(np.diff(graph.following.indptr))
+    written = 0
+    for start in range(0, len(with_follows), batch_size):
+        rows = with_follows[start:start + batch_size]
+        owners, candidates, scores = graph.suggest(rows, top_k)
+        _save(graph, rows, owners, candidates, scores)
+        written += len(owners)
+        if progress is not None:
+            progress(start + len(rows), len(with_follows), written)
+    # Пользователи, отписавшиеся от всех, не должны видеть старые советы.
+    FollowSuggestion.objects.exclude(
+        user_id__in=Follow.objects.values('user_id')).delete()
+    return written
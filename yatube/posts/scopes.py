@@ -0,0 +1,35 @@
+"""Области инвалидации кеша страниц приложения posts.
+
+Страница зависит от списка областей, сигналы моделей начинают новое
+поколение тех областей, которые затронула запись (см. core.page_cache).
+"""
+FEED = 'feed'
+GROUPS = 'groups'
+
+
+def group(slug):
+    return f'group:{slug}'
+
+
+def author(username):
+    return f'author:{username}'
+
+
+def post(post_id):
+    return f'post:{post_id}'
+
+
+def follows(user_id):
+    return f'follows:{user_id}'
+
+
+def index_page():
+    return [FEED, GROUPS]
+
+
+def group_page(slug):
+    return [group(slug), GROUPS]
+
+
+def profile_page(username):
+    return [author(username), GROUPS]
@@ -0,0 +1,154 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — таблица SQLite FTS5 ``posts_post_fts`` поверх ``posts_post``
+(external content: текст хранится только в самой таблице постов). Её
+синхронизируют триггеры базы на вставку, правку и удаление, поэтому в
+индекс попадают и ``bulk_create``, и ``update()``. Миграция, которая
+пересоздаёт таблицу постов в SQLite, теряет триггеры — она должна
+создать их заново; SQL триггеров миграции держат у себя, а не
+импортируют из этого модуля.
+
+Результаты упорядочены по BM25 и листаются по ключу ``(ранг, id)`` без
+OFFSET, как и ленты.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .pagination import (BaseCursorPaginator, CursorPage, InvalidCursor,
+                         decode_values, encode_cursor)
+
+FTS_TABLE = 'posts_post_fts'
+
+CREATE_INDEX = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')"
+)
+DROP_INDEX = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': (
+        'AFTER INSERT ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+    f'{FTS_TABLE}_delete': (
+        'AFTER DELETE ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        'END'
+    ),
+    f'{FTS_TABLE}_update': (
+        'AFTER UPDATE OF text ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+}
+
+_WORD = re.compile(r'\w+')
+
+
+def install_triggers(cursor):
+    for name, body in TRIGGERS.items():
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'CREATE TRIGGER {name} {body}')
+
+
+def rebuild(cursor):
+    """Создаёт индекс и триггеры и заново наполняет индекс."""
+    cursor.execute(CREATE_INDEX)
+    install_triggers(cursor)
+    cursor.execute(
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """Запрос пользователя как выражение MATCH или None, если слов нет.
+
+    Все слова обязательны, последнее ищется как префикс. Кавычки не дают
+    пользователю писать операторы FTS5.
+    """
+    words = _WORD.findall(query.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class _IdSubquery(RawSQL):
+    # Лукап ``__in`` сам берёт подзапрос в скобки; со скобками RawSQL
+    # получилось бы ``IN ((...))`` — сравнение с первой строкой.
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def matching_ids(query):
+    """Подзапрос с id постов, подходящих под ``query``, или None.
+
+    Годится для ``filter(pk__in=...)``.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return None
+    return _IdSubquery(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [expression])
+
+
+class SearchPaginator(BaseCursorPaginator):
+    """Постраничная выдача поиска по ключу ``(ранг, id)``.
+
+    Страницы совместимы с ``CursorPage`` и шаблонами курсорной пагинации.
+    """
+
+    def __init__(self, query, per_page):
+        self.expression = match_expression(query)
+        self.per_page = int(per_page)
+
+    def cursor_for(self, post):
+        return encode_cursor((post.search_rank, post.pk))
+
+    def _ranked_ids(self, after):
+        sql = (
+            f'SELECT rowid, bm25({FTS_TABLE}) AS search_rank '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [self.expression]
+        if after is not None:
+            sql += (' AND (search_rank > %s'
+                    ' OR (search_rank = %s AND rowid < %s))')
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY search_rank, rowid DESC LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def page(self, after=None):
+        """Страница результатов после токена ``after``."""
+        if self.expression is None:
+            return CursorPage([], False, False, self)
+        position = None
+        if after:
+            rank, pk = decode_values(after, 2)
+            try:
+                position = float(rank), int(pk)
+            except ValueError:
+                raise InvalidCursor(after)
+        rows = self._ranked_ids(position)
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in rows])
+        results = []
+        for pk, rank in rows:
+            # Пост мог быть удалён между двумя запросами.
+            if pk in posts:
+                posts[pk].search_rank = rank
+                results.append(posts[pk])
+        return CursorPage(results, has_next, bool(after), self)
@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import page_cache
+from . import counters, follows, scopes, thumbnails, timeline, trending
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def invalidate_post_pages(post, *group_ids):
+    """Новое поколение для лент, где виден пост."""
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk is not None]
+    ).values_list('slug', flat=True)
+    page_cache.bump(
+        scopes.FEED,
+        scopes.author(post.author.username),
+        scopes.post(post.pk),
+        *[scopes.group(slug) for slug in slugs],
+    )
+
+
+def _only_last_login(update_fields):
+    # Вход пользователя сохраняет только last_login: страницы не меняются.
+    return update_fields is not None and set(update_fields) == {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def user_remember_state(sender, instance, update_fields=None, **kwargs):
+    instance._saved_username = None
+    if not instance._state.adding and not _only_last_login(update_fields):
+        instance._saved_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+        page_cache.bump(scopes.author(instance.username))
+        return
+    if _only_last_login(update_fields):
+        return
+    # Имя автора есть в карточках всех лент, а старый адрес профиля
+    # должен перестать отдаваться из кеша.
+    page_cache.bump(
+        scopes.FEED,
+        scopes.GROUPS,
+        scopes.author(instance.username),
+        *([scopes.author(instance._saved_username)]
+          if instance._saved_username else []),
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_state(sender, instance, **kwargs):
+    instance._saved_group_id, instance._saved_image = None, ''
+    if not instance._state.adding:
+        instance._saved_group_id, instance._saved_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image').first() or (None, ''))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        counters.bump_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+        trending.record(instance, trending.POST_POINTS)
+    elif instance._saved_group_id != instance.group_id:
+        counters.bump_group(instance._saved_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+        trending.regroup([instance.pk], instance.group_id)
+    if instance.image.name != instance._saved_image:
+        counters.bump_blob(instance.image.name, 1)
+        counters.bump_blob(instance._saved_image, -1)
+        if instance.image:
+            thumbnails.schedule(instance.image.name)
+    invalidate_post_pages(
+        instance, instance.group_id, instance._saved_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    counters.bump_group(instance.group_id, -1)
+    counters.bump_blob(instance.image.name, -1)
+    invalidate_post_pages(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+        if instance.post_id is not None:
+            trending.record(instance.post, trending.COMMENT_POINTS)
+    page_cache.bump(scopes.post(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    page_cache.bump(scopes.post(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    page_cache.bump(scopes.GROUPS, scopes.group(instance.slug))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        counters.bump_user(instance.user_id, 'following_count', 1)
+        timeline.add_author(instance.user_id, instance.author_id)
+        follows.invalidate(instance.user_id)
+        trending.record_follow(instance.author_id)
+        page_cache.bump(scopes.author(instance.author.username))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    counters.bump_user(instance.user_id, 'following_count', -1)
+    timeline.remove_author(instance.user_id, instance.author_id)
+    follows.invalidate(instance.user_id)
+    page_cache.bump(scopes.author(instance.author.username))
@@ -0,0 +1,58 @@
+"""Хранилище изображений постов по содержимому.
+
+Файл сохраняется под именем ``<каталог>/<xx>/<sha256>.<расширение>``,
+где хеш считается по ходу записи. Одинаковые изображения, загруженные
+много раз, лежат на диске одним файлом и дают общие миниатюры. Сколько
+постов ссылается на файл, учитывает ``ImageBlob``; файлы без ссылок
+удаляет команда ``collect_image_blobs``.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def digest_name(directory, digest, extension):
+    return os.path.join(directory, digest[:2], f'{digest}{extension}')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, именующее файлы хешем содержимого."""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменяется хешем в ``_save``, а совпадение имён
+        # означает совпадение содержимого.
+        return name
+
+    def _save(self, name, content):
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+                dir=full_directory, delete=False) as temporary:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+        name = digest_name(directory, digest.hexdigest(), extension)
+        path = self.path(name)
+        if os.path.exists(path):
+            # Свежая дата изменения защищает файл от сборки мусора, пока
+            # ссылающийся на него пост ещё не записан.
+            os.unlink(temporary.name)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(temporary.name, self.file_permissions_mode or 0o644)
+            os.replace(temporary.name, path)
+        return name.replace('\\', '/')
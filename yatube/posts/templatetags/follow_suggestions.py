@@ -0,0 +1,27 @@
+from django import template
+
+from posts import follows
+from posts.models import FollowSuggestion
+
+register = template.Library()
+
+
+@register.inclusion_tag(
+    'posts/includes/follow_suggestions.html', takes_context=True)
+def follow_suggestions(context, limit=5):
+    """Рекомендованные авторы без тех, на кого уже есть подписка.
+
+    Рекомендации считаются офлайн и могут отставать от подписок; строк
+    у пользователя не больше, чем насчитала команда.
+    """
+    user = context['request'].user
+    suggestions = []
+    if user.is_authenticated:
+        following = follows.following_ids(user)
+        suggestions = [
+            suggestion for suggestion in
+            FollowSuggestion.objects.filter(user=user).select_related(
+                'author').order_by('-score')
+            if suggestion.author_id not in following
+        ][:limit]
+    return {'suggestions': suggestions}
@@ -0,0 +1,64 @@
+"""Кеш готовых карточек постов, общий для всех лент.
+
+Ключ карточки содержит id поста и версию: время последней правки поста,
+имя автора и slug группы. Правка, смена группы или переименование автора
+дают новый ключ, так что старые карточки не нужно удалять явно.
+
+Число просмотров меняется при каждой записи счётчиков, поэтому в кеш
+карточка попадает с меткой на его месте, а число подставляется при
+выдаче.
+"""
+from hashlib import md5
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import pictures
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+VIEWS_MARKER = mark_safe('<!--views-->')
+
+
+def card_key(post):
+    version = '|'.join((
+        post.updated.isoformat(),
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    ))
+    return f'post-card:{post.pk}:{md5(version.encode()).hexdigest()}'
+
+
+@register.simple_tag
+def post_cards(posts):
+    """HTML карточек: из кеша одним get_many, недостающие рендерятся.
+
+    Варианты изображений недостающих карточек тоже берутся пачкой.
+    """
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    pending = [(key, post) for key, post in zip(keys, posts)
+               if key not in cards]
+    images = pictures([post.image for _, post in pending], 'card')
+    missing = {}
+    for key, post in pending:
+        cards[key] = render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'picture': images.get(post.image.name),
+            'views': VIEWS_MARKER,
+        })
+        # Карточка с исходным файлом вместо миниатюр не кешируется:
+        # её ключ не изменится, когда миниатюры будут готовы.
+        if not post.image or post.image.name in images:
+            missing[key] = cards[key]
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return [
+        mark_safe(cards[key].replace(VIEWS_MARKER, str(post.views_count), 1))
+        for key, post in zip(keys, posts)
+    ]
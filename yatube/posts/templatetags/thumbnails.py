@@ -0,0 +1,13 @@
+from django import template
+
+from posts.thumbnails import pictures
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(image, name):
+    """Варианты изображения поста для ``<picture>`` или None."""
+    if not image:
+        return None
+    return pictures([image], name).get(image.name)
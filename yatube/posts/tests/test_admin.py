@@ -0,0 +1,174 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import admin_tools
+from core.query_budget import QueryRecorder
+from posts import bulk
+from posts.models import BulkJob, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class LargeTableAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        group = Group.objects.create(title='Группа', slug='group')
+        authors = [User.objects.create_user(username=f'author{i}')
+                   for i in range(5)]
+        for i in range(30):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=authors[i % 5], group=group)
+            Comment.objects.create(
+                post=post, author=authors[-1], text=f'Комментарий {i}')
+        Follow.objects.create(user=authors[0], author=authors[1])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelists_without_n_plus_one(self):
+        """Списки админки не делают запросов на строку и DISTINCT."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                recorder = QueryRecorder()
+                with connection.execute_wrapper(recorder):
+                    response = self.client.get(
+                        reverse(f'admin:posts_{model}_changelist'))
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(recorder.problems(budget=10),
+                                 '\n'.join(recorder.queries))
+                self.assertNotIn(
+                    'DISTINCT', ' '.join(recorder.queries).upper())
+
+    def test_estimated_count(self):
+        """Большая таблица оценивается по id, выборка — до предела."""
+        with mock.patch.object(admin_tools, 'EXACT_COUNT_LIMIT', 10):
+            paginator = admin_tools.EstimatedCountPaginator(
+                Post.objects.all(), 100)
+            self.assertEqual(
+                paginator.count, Post.objects.order_by('-pk')[0].pk)
+            paginator = admin_tools.EstimatedCountPaginator(
+                Post.objects.filter(text__startswith='Пост'), 100)
+            self.assertEqual(paginator.count, 10)
+
+    def test_date_hierarchy_from_bounds(self):
+        """Иерархия дат строится по границам выборки."""
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'))
+        self.assertContains(
+            response, f'pub_date__day={post.pub_date.day}')
+
+    def test_search_uses_full_text_index(self):
+        """Поиск в списке находит все посты по индексу."""
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'Пост 1'})
+        # «Пост 1» и «Пост 10» … «Пост 19».
+        self.assertEqual(len(response.context['cl'].result_list), 11)
+
+    def test_export_streams_filtered_changelist(self):
+        """Выгрузка идёт потоком и учитывает поиск списка."""
+        url = reverse('admin:posts_post_export', args=['csv'])
+        response = self.client.get(url, {'q': 'Пост 1'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3],
+                         ['pk', 'pub_date', 'author__username'])
+        # «Пост 1» и «Пост 10» … «Пост 19».
+        self.assertEqual(len(lines), 12)
+        response = self.client.get(
+            reverse('admin:posts_post_export', args=['jsonl']))
+        self.assertEqual(
+            len(b''.join(response.streaming_content).splitlines()), 30)
+
+    def test_bulk_actions_run_in_chunks(self):
+        """Массовые действия выполняются порциями и ведут прогресс."""
+        other = Group.objects.create(title='Другая', slug='other')
+        url = reverse('admin:posts_post_changelist')
+        with mock.patch.object(bulk, 'CHUNK_SIZE', 7):
+            self.client.post(url, {
+                'action': 'move_in_background', 'select_across': 1,
+                'index': 0, 'group': other.pk,
+                '_selected_action': [Post.objects.first().pk],
+            })
+            job = BulkJob.objects.get()
+            self.assertEqual(job.total, 30)
+            job = bulk.run(job.pk)
+        self.assertEqual((job.status, job.processed), (BulkJob.DONE, 30))
+        self.assertEqual(other.posts.count(), 30)
+        other.refresh_from_db()
+        self.assertEqual(other.posts_count, 30)
+
+        ids = Post.objects.filter(
+            text__endswith='1').values_list('pk', flat=True)
+        job = bulk.start(self.admin, BulkJob.DELETE, Post.objects.filter(
+            pk__in=list(ids)))
+        job = bulk.run(job.pk)
+        self.assertEqual(job.processed, 3)
+        self.assertEqual(Post.objects.count(), 27)
+
+    def test_bulk_job_claimed_once(self):
+        """Задание с действующей арендой не берёт второй обработчик."""
+        job = bulk.start(self.admin, BulkJob.DELETE, Post.objects.filter(
+            text__endswith='2'))
+        self.assertEqual(job.items.count(), 3)
+        self.assertTrue(bulk.claim(job.pk))
+        self.assertFalse(bulk.claim(job.pk))
+        job = bulk.run(job.pk)
+        self.assertEqual((job.status, job.processed), (BulkJob.RUNNING, 0))
+        BulkJob.objects.filter(pk=job.pk).update(
+            lease_until=timezone.now() - timedelta(seconds=1))
+        call_command('run_bulk_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (BulkJob.DONE, 3))
+        self.assertFalse(job.items.exists())
+        self.assertEqual(Post.objects.count(), 27)
+
+
+@override_settings(BULK_JOB_WORKERS=1)
+class BulkJobWorkerTest(TransactionTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author) for i in range(5))
+
+    def wait_for_workers(self):
+        # Пул из одного потока выполняет задачи по очереди.
+        bulk._pool.executor().submit(lambda: None).result()
+
+    def test_job_runs_in_background_pool(self):
+        """Задание выполняет фоновый пул, а не поток запроса."""
+        with mock.patch.object(bulk, 'CHUNK_SIZE', 2):
+            job = bulk.start(self.admin, BulkJob.DELETE, Post.objects.all())
+            self.wait_for_workers()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (BulkJob.DONE, 5))
+        self.assertFalse(Post.objects.exists())
+
+    def test_expired_lease_reclaimed_by_worker(self):
+        """Задание упавшего обработчика подхватывается после аренды."""
+        with mock.patch.object(bulk, 'schedule'):
+            job = bulk.start(self.admin, BulkJob.DELETE, Post.objects.all())
+        self.assertTrue(bulk.claim(job.pk))
+        bulk.schedule(job.pk)
+        self.wait_for_workers()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (BulkJob.RUNNING, 0))
+        BulkJob.objects.filter(pk=job.pk).update(
+            lease_until=timezone.now() - timedelta(seconds=1))
+        bulk.schedule(job.pk)
+        self.wait_for_workers()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (BulkJob.DONE, 5))
+        self.assertIsNone(job.lease_until)
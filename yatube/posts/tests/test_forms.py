@@ -1,14 +1,33 @@
+import os
 import shutil
 import tempfile
+from hashlib import sha256
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.test import TestCase, Client, override_settings
-from posts.models import Post, Group, Comment
+from core.locks import cache_lock
+from posts import thumbnails
+from posts.models import Post, Group, Comment, ImageBlob
+from posts.storage import digest_name
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.models import KVStore
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 User = get_user_model()
 
@@ -44,17 +63,9 @@ class PostCreateFormTests(TestCase):
     def test_post_create(self):
         """Валидная форма создает запись в Post."""
         posts_count = Post.objects.count()
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         form_data = {
@@ -70,12 +81,168 @@ class PostCreateFormTests(TestCase):
             response,
             reverse('posts:profile', kwargs={'username': 'TestName'}))
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text='Новый тестовый текст',
-                image='posts/small.gif'
-            ).exists()
-        )
+        post = Post.objects.get(text='Новый тестовый текст')
+        with open(post.image.path, 'rb') as stored:
+            content = stored.read()
+        self.assertEqual(post.image.name, digest_name(
+            'posts', sha256(content).hexdigest(), '.gif'))
+
+    def test_upload_schedules_thumbnails(self):
+        """Загрузка изображения ставит создание миниатюр в очередь."""
+        uploaded = SimpleUploadedFile(
+            'thumb.gif', SMALL_GIF, content_type='image/gif')
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            self.authorized_client_author.post(
+                reverse('posts:post_create'),
+                data={'text': 'С картинкой', 'image': uploaded})
+            post = Post.objects.get(text='С картинкой')
+            schedule.assert_called_once_with(post.image.name)
+            post.text = 'Без новой картинки'
+            post.save()
+            schedule.assert_called_once()
+        self.assertTrue(thumbnails.generate(post.image.name))
+        with cache_lock(f'thumbnail:{post.image.name}'):
+            self.assertFalse(thumbnails.generate(post.image.name))
+
+    def test_picture_variants(self):
+        """Изображение выводится в нескольких ширинах и форматах.
+
+        Пока миниатюры не готовы, выводится исходный файл.
+        """
+        with mock.patch.object(
+                thumbnails._pool, 'submit_on_commit') as submit_on_commit:
+            post = Post.objects.create(
+                author=self.user, text='Картинка',
+                image=SimpleUploadedFile('wide.gif', SMALL_GIF))
+            address = reverse(
+                'posts:post_detail', kwargs={'post_id': post.pk})
+            response = self.guest_client.get(address)
+            thumbnails.pictures([post.image], 'card')
+        # Нарезка уже в очереди после загрузки, показы её не повторяют.
+        submit_on_commit.assert_called_once()
+        self.assertNotContains(response, '<picture>')
+        self.assertContains(response, f'src="{post.image.url}"')
+        thumbnails.generate(post.image.name)
+        response = self.guest_client.get(address)
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, ' 480w, ')
+        self.assertEqual(thumbnails.formats()[-1], 'JPEG')
+        with mock.patch.dict(thumbnails.Image.SAVE, {'WEBP': None}):
+            self.assertEqual(thumbnails.formats(), ['WEBP', 'JPEG'])
+
+    def test_generated_thumbnails_reused(self):
+        """Заранее нарезанные миниатюры находятся при показе и в сборке."""
+        content = BytesIO()
+        Image.new('RGB', (40, 20), (12, 34, 56)).save(content, 'PNG')
+        post = Post.objects.create(
+            author=self.user, text='Миниатюры',
+            image=SimpleUploadedFile('unique.png', content.getvalue()))
+
+        def state():
+            files = sum(len(names) for _, _, names in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'cache')))
+            return files, KVStore.objects.count()
+
+        before = state()
+        self.assertTrue(thumbnails.generate(post.image.name))
+        generated = state()
+        self.assertGreater(generated[0], before[0])
+        self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(state(), generated)
+        post.delete()
+        call_command('collect_image_blobs', grace=0, stdout=StringIO())
+        self.assertEqual(state()[0], before[0])
+
+    def test_feed_pictures_without_thumbnail_lookups(self):
+        """Лента берёт варианты нарезанных изображений из кеша пачкой."""
+        for color in range(3):
+            content = BytesIO()
+            Image.new('RGB', (40, 20), (color, 0, 0)).save(content, 'PNG')
+            post = Post.objects.create(
+                author=self.user, text=f'Картинка {color}',
+                image=SimpleUploadedFile('feed.png', content.getvalue()))
+            thumbnails.generate(post.image.name)
+        with mock.patch.object(
+                default.kvstore, 'get', wraps=default.kvstore.get) as get:
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>', count=3)
+        get.assert_not_called()
+
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_upload_normalized(self):
+        """Фото уменьшается, поворачивается по EXIF и теряет метаданные."""
+        photo = Image.new('RGB', (400, 200))
+        exif = photo.getexif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Телефон'
+        content = BytesIO()
+        photo.save(content, 'JPEG', exif=exif)
+        self.authorized_client_author.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': SimpleUploadedFile(
+                'photo.jpg', content.getvalue(), content_type='image/jpeg')})
+        post = Post.objects.get(text='Фото')
+        self.assertRegex(post.image.name, r'^posts/\w{2}/\w{64}\.jpg$')
+        with Image.open(post.image) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertFalse(stored.getexif())
+            self.assertTrue(stored.info.get('progressive'))
+
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_other_formats_normalized(self):
+        """GIF и BMP тоже уменьшаются, BMP перекодируется в PNG."""
+        frames = [Image.new('P', (400, 200), color) for color in (1, 2)]
+        gif = BytesIO()
+        frames[0].save(gif, 'GIF', save_all=True, append_images=frames[1:])
+        bmp = BytesIO()
+        Image.new('RGB', (300, 600)).save(bmp, 'BMP')
+        for name, content, size, image_format in (
+                ('anim.gif', gif, (100, 50), 'GIF'),
+                ('photo.bmp', bmp, (50, 100), 'PNG')):
+            with self.subTest(name=name):
+                self.authorized_client_author.post(
+                    reverse('posts:post_create'),
+                    data={'text': name, 'image': SimpleUploadedFile(
+                        name, content.getvalue())})
+                post = Post.objects.get(text=name)
+                self.assertTrue(post.image.name.endswith(
+                    f'.{image_format.lower()}'))
+                with Image.open(post.image) as stored:
+                    self.assertEqual(
+                        (stored.size, stored.format), (size, image_format))
+                    self.assertEqual(
+                        getattr(stored, 'n_frames', 1),
+                        2 if image_format == 'GIF' else 1)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_decompression_bomb_rejected(self):
+        """Изображение больше допустимого числа пикселей отвергается."""
+        response = self.authorized_client_author.post(
+            reverse('posts:post_create'),
+            data={'text': 'Бомба', 'image': SimpleUploadedFile(
+                'bomb.gif', SMALL_GIF, content_type='image/gif')})
+        self.assertFormError(
+            response, 'form', 'image', 'Изображение слишком большое: 2×1.')
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
+
+    def test_same_image_stored_once(self):
+        """Одинаковые изображения хранятся одним файлом со счётчиком ссылок."""
+        posts = [
+            Post.objects.create(
+                author=self.user, text=f'Повтор {number}',
+                image=SimpleUploadedFile(f'copy{number}.gif', SMALL_GIF))
+            for number in range(2)
+        ]
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+        self.assertEqual(ImageBlob.objects.get(name=name).refcount, 2)
+        for post in posts:
+            post.delete()
+        self.assertEqual(ImageBlob.objects.get(name=name).refcount, 0)
+        call_command('collect_image_blobs', grace=0, stdout=StringIO())
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertFalse(Post.image.field.storage.exists(name))
 
     def test_guest_post_not_create(self):
         """Гость до создания поста отправится на авторизацию"""
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import search
+from posts.models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                          TimelineEntry, UserStats)
+
+User = get_user_model()
+
+
+class ImportContentTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def call(self, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_content', *args, stdout=stdout, stderr=stderr,
+                     **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_posts_imported_with_derived_data(self):
+        """Посты пишутся без сигналов, производные данные пересчитываются."""
+        path = self.write('posts.jsonl', [
+            json.dumps({'id': 100, 'author': 'author', 'group': 'group',
+                        'text': 'Старый пост', 'pub_date': '2015-05-01T10:00'
+                        ':00+00:00'}),
+            json.dumps({'author': 'nobody', 'text': 'Чужой пост'}),
+            '{не json',
+            json.dumps({'id': 101, 'author': 'author', 'text': 'Второй'}),
+        ])
+        _, errors = self.call('posts', path)
+        self.assertIn('запись 2: неизвестный пользователь nobody', errors)
+        self.assertIn('запись 3: некорректный JSON', errors)
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date,
+                         datetime(2015, 5, 1, 10, tzinfo=timezone.utc))
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader).values_list(
+                'post_id', flat=True)), {100, 101})
+        self.assertQuerysetEqual(
+            Post.objects.filter(pk__in=search.matching_ids('Старый')),
+            [post], transform=lambda found: found)
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertEqual(
+            (checkpoint.rows, checkpoint.imported, checkpoint.skipped),
+            (4, 2, 2))
+        self.assertIsNotNone(checkpoint.finished)
+        with self.assertRaises(CommandError):
+            self.call('posts', path)
+
+    def test_existing_rows_reported_not_counted(self):
+        """Пост с занятым id и повторная подписка пропускаются с причиной."""
+        post = Post.objects.create(author=self.author, text='Существующий')
+        path = self.write('posts.jsonl', [
+            json.dumps({'id': post.pk, 'author': 'reader', 'text': 'Чужой'}),
+            json.dumps({'id': 200, 'author': 'reader', 'text': 'Новый'}),
+            json.dumps({'id': 200, 'author': 'reader', 'text': 'Повтор'}),
+        ])
+        _, errors = self.call('posts', path)
+        self.assertIn('запись 1: пост с таким id уже есть', errors)
+        self.assertIn('запись 3: пост с таким id уже есть', errors)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Существующий')
+        self.assertEqual(Post.objects.get(pk=200).text, 'Новый')
+        path = self.write('follows.jsonl', [
+            json.dumps({'user': 'reader', 'author': 'author'}),
+            json.dumps({'user': 'author', 'author': 'reader'}),
+        ])
+        _, errors = self.call('follows', path)
+        self.assertIn('запись 1: подписка уже есть', errors)
+        self.assertEqual(
+            list(ImportCheckpoint.objects.order_by('pk').values_list(
+                'kind', 'imported', 'skipped')),
+            [(ImportCheckpoint.POSTS, 1, 2),
+             (ImportCheckpoint.FOLLOWS, 1, 1)])
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.author, post_id=200).exists())
+
+    def test_resumes_from_checkpoint(self):
+        """Повторный запуск продолжает импорт с первой незаписанной записи."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        path = self.write('comments.csv', [
+            'post,author,text,created',
+            f'{post.pk},author,Первый,2015-05-01T10:00:00',
+            f'{post.pk},reader,Второй,',
+        ])
+        ImportCheckpoint.objects.create(
+            source=os.path.abspath(path), kind=ImportCheckpoint.COMMENTS,
+            rows=1, imported=1)
+        self.call('comments', path)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)), ['Второй'])
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_follows_create_missing_users(self):
+        """С --create-users неизвестные пользователи создаются."""
+        path = self.write('follows.jsonl', [
+            json.dumps({'user': 'newcomer', 'author': 'author'}),
+            json.dumps({'user': 'reader', 'author': 'author'}),
+            json.dumps({'user': 'author', 'author': 'author'}),
+        ])
+        _, errors = self.call('follows', path, create_users=True)
+        self.assertIn('запись 3: подписка на самого себя', errors)
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 2)
+        self.assertEqual(newcomer.stats.following_count, 1)
@@ -1,6 +1,9 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -44,3 +47,56 @@ class PostModelTest(TestCase):
         expected_object_name = post._meta.get_field('group').help_text
         self.assertEqual(
             expected_object_name, 'Группа, к которой будет относиться пост')
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+
+    def refresh(self):
+        for obj in (self.author.stats, self.reader.stats,
+                    self.group, self.other_group):
+            obj.refresh_from_db()
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании, правке и удалении."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.refresh()
+        post.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        post.group = self.other_group
+        post.save()
+        follow.delete()
+        self.refresh()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 0)
+        post.delete()
+        self.refresh()
+        self.assertEqual(self.author.stats.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_reconcile_counters(self):
+        """Команда пересчёта исправляет разошедшиеся счётчики."""
+        Post.objects.create(author=self.author, text='Пост', group=self.group)
+        UserStats.objects.update(posts_count=42)
+        Group.objects.update(posts_count=42)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import recommendations
+from posts.models import Follow, FollowSuggestion
+
+User = get_user_model()
+
+
+class FollowSuggestionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {name: User.objects.create_user(username=name)
+                     for name in 'abcde'}
+        for user, author in ('ab', 'bc', 'db', 'de'):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_friends_of_friends_and_cofollows(self):
+        """Друзья друзей оцениваются выше совместных подписок."""
+        call_command('build_follow_suggestions', batch_size=2)
+        suggestions = FollowSuggestion.objects.filter(
+            user=self.users['a']).order_by('-score')
+        self.assertEqual(
+            [(suggestion.author.username, suggestion.score)
+             for suggestion in suggestions],
+            [('c', recommendations.FRIENDS_OF_FRIENDS_WEIGHT),
+             ('e', recommendations.COFOLLOW_WEIGHT)])
+        self.assertFalse(FollowSuggestion.objects.filter(
+            author__in=[self.users['a'], self.users['b']],
+            user=self.users['a']).exists())
+
+    def test_command_requires_numpy(self):
+        """Без NumPy команда сообщает, что его нужно установить."""
+        with mock.patch.object(recommendations, 'np', None), \
+                self.assertRaises(CommandError):
+            call_command('build_follow_suggestions')
+
+    def test_widget_skips_followed_authors(self):
+        """Виджет ленты не предлагает тех, на кого уже есть подписка."""
+        user = self.users['a']
+        FollowSuggestion.objects.create(
+            user=user, author=self.users['c'], score=1.0)
+        FollowSuggestion.objects.create(
+            user=user, author=self.users['b'], score=2.0)
+        self.client.force_login(user)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(
+            response, reverse('posts:profile_follow', args=['c']))
+        self.assertNotContains(
+            response, reverse('posts:profile_follow', args=['b']))
@@ -0,0 +1,74 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import trending
+from posts.models import Comment, Group, Post, TrendingBucket
+
+User = get_user_model()
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.quiet = Post.objects.create(
+            text='Тихий пост', author=cls.author, group=cls.group)
+        cls.discussed = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.author)
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.discussed, author=cls.author, text=f'Ответ {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_events_counted_in_buckets(self):
+        """Посты и комментарии копятся в счётчике текущего часа."""
+        bucket = TrendingBucket.objects.get(post=self.discussed)
+        self.assertEqual(bucket.bucket, trending.current_bucket())
+        self.assertEqual(
+            bucket.points,
+            trending.POST_POINTS + 3 * trending.COMMENT_POINTS)
+
+    def test_old_points_decay(self):
+        """Очки затухают со временем, а счётчики вне окна удаляются."""
+        now = time.time()
+        later = now + trending.HALF_LIFE_BUCKETS * trending.BUCKET_SECONDS
+        post = Post.objects.create(text='Свежий пост', author=self.author)
+        TrendingBucket.objects.filter(post=post).update(
+            bucket=trending.current_bucket(later), points=6)
+        # 10 очков обсуждаемого поста за период полураспада стали 5.
+        self.assertEqual(trending.refresh(later)['site'][:2],
+                         [post.pk, self.discussed.pk])
+        far = now + trending.WINDOW_BUCKETS * trending.BUCKET_SECONDS
+        trending.refresh(far)
+        self.assertFalse(
+            TrendingBucket.objects.exclude(post=post).exists())
+
+    def test_cold_cache_refreshed_by_lock_holder_only(self):
+        """Без списка в кеше пересчитывает только владелец блокировки."""
+        cache.add(f'lock:{trending.CACHE_KEY}', 'other', 30)
+        with mock.patch.object(trending, 'LOCK_WAIT', 0.1), \
+                mock.patch.object(trending, 'refresh') as refresh:
+            self.assertEqual(trending.top_ids(), [])
+        refresh.assert_not_called()
+        cache.delete(f'lock:{trending.CACHE_KEY}')
+        self.assertEqual(trending.top_ids(),
+                         [self.discussed.pk, self.quiet.pk])
+
+    def test_pages_served_from_list(self):
+        """Страницы популярного читают готовый список."""
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(list(response.context['posts']),
+                         [self.discussed, self.quiet])
+        with self.assertNumQueries(1):
+            self.client.get(reverse('posts:trending'))
+        response = self.client.get(
+            reverse('posts:group_trending', kwargs={'slug': 'group'}))
+        self.assertEqual(list(response.context['posts']), [self.quiet])
@@ -1,16 +1,47 @@
 import tempfile
+import tracemalloc
 import shutil
+from hashlib import sha256
+from io import BytesIO, StringIO
 
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.urls import reverse
-from posts.models import Post, Group, Comment, Follow
+from django.utils.http import http_date
+from core.testing import QueryBudgetTestMixin
+from posts import (follows, thumbnails, urls as posts_urls, view_counts,
+                   views)
+from posts.storage import digest_name
+from posts.templatetags.post_cards import card_key
+from posts.models import (Post, Group, Comment, Follow, PulledAuthor,
+                          TimelineEntry)
 from django import forms
+from PIL import Image
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+IMAGE_NAME = digest_name('posts', sha256(SMALL_GIF).hexdigest(), '.gif')
+
+
+def png_file(name, color):
+    content = BytesIO()
+    Image.new('RGB', (4, 2), color).save(content, 'PNG')
+    return SimpleUploadedFile(name, content.getvalue(), 'image/png')
+
 
 User = get_user_model()
 
@@ -30,17 +61,9 @@ class PostPagesTest(TestCase):
             slug='test-slug_dif',
             description='Тестовое описание другое',
         )
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         cls.post = Post.objects.create(
@@ -112,22 +135,89 @@ class PostPagesTest(TestCase):
         self.assertEqual(context['post_text_0'], 'Тестовый текст')
         self.assertEqual(context['post_author_0'], 'TestName')
         self.assertEqual(context['post_group_0'], 'Тестовая группа')
-        self.assertEqual(context['post_image_0'], 'posts/small.gif')
+        self.assertEqual(context['post_image_0'], IMAGE_NAME)
 
     def test_index_cache(self):
-        """Проверка работы кеша"""
+        """Кеш главной сбрасывается записью и отдаётся без запросов к БД."""
         Post.objects.create(
             author=User.objects.get(username='TestName'),
             text='Тест кеша'
         )
         response_before_delete = self.client.get(reverse('posts:index'))
         self.assertContains(response_before_delete, 'Тест кеша')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.content, response_before_delete.content)
         Post.objects.filter(text='Тест кеша').delete()
         response = self.client.get(reverse('posts:index'))
-        self.assertContains(response, response_before_delete.content)
-        cache.clear()
-        response = self.client.get(reverse('posts:index'))
-        self.assertNotContains(response, response_before_delete.content)
+        self.assertNotContains(response, 'Тест кеша')
+
+    def test_profile_cache_shared_between_users(self):
+        """Профиль кешируется один раз, а шапка и кнопка у каждого свои."""
+        address = reverse('posts:profile', kwargs={'username': 'Following'})
+        self.assertNotContains(self.client.get(address), 'Отписаться')
+        with self.assertNumQueries(3):
+            response = self.authorized_client_follower.get(address)
+        self.assertContains(response, 'Пользователь: Follower')
+        self.assertContains(response, 'Отписаться')
+        response = self.authorized_client_test_user.get(address)
+        self.assertContains(response, 'Пользователь: TestCommentor')
+        self.assertContains(response, 'Подписаться')
+
+    def test_group_cache_invalidated_by_group_change(self):
+        """Правка группы сбрасывает кеш её страницы."""
+        address = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.client.get(address)
+        Group.objects.filter(slug='test-slug').update(title='Не сброшено')
+        self.assertNotContains(self.client.get(address), 'Не сброшено')
+        group = Group.objects.get(slug='test-slug')
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.client.get(address), 'Новое название')
+
+    def test_author_change_invalidates_feeds(self):
+        """Смена имени автора видна в закешированных лентах."""
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+        ]
+        for address in addresses:
+            self.assertNotContains(self.client.get(address), 'Новое Имя')
+        author = User.objects.get(username='TestName')
+        author.first_name, author.last_name = 'Новое', 'Имя'
+        author.save()
+        for address in addresses:
+            with self.subTest(address=address):
+                self.assertContains(self.client.get(address), 'Новое Имя')
+
+    def test_username_change_invalidates_old_profile(self):
+        """После смены логина старый адрес профиля не отдаётся из кеша."""
+        old = reverse('posts:profile', kwargs={'username': 'TestName'})
+        self.assertEqual(self.client.get(old).status_code, 200)
+        author = User.objects.get(username='TestName')
+        author.username = 'Renamed'
+        author.save()
+        self.assertEqual(self.client.get(old).status_code, 404)
+        new = reverse('posts:profile', kwargs={'username': 'Renamed'})
+        self.assertEqual(self.client.get(new).status_code, 200)
+
+    def test_post_card_cache_versioned(self):
+        """Карточка берётся из кеша и обновляется после правки поста."""
+        address = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.client.get(address)
+        # Пока миниатюры не нарезаны, карточка не кешируется.
+        self.assertIsNone(cache.get(card_key(self.post)))
+        thumbnails.generate(self.post.image.name)
+        self.client.get(address)
+        self.assertIsNotNone(cache.get(card_key(self.post)))
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertIsNone(cache.get(card_key(post)))
+        response = self.client.get(address)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertNotContains(response, 'Тестовый текст')
 
     def test_group_correct_context(self):
         """Шаблон group_list сформирован с правильным контекстом."""
@@ -135,7 +225,7 @@ class PostPagesTest(TestCase):
             reverse('posts:group_list', kwargs={'slug': 'test-slug'}))
         self.assertEqual(context['post_text_0'], 'Тестовый текст')
         self.assertEqual(context['post_group_0'], 'Тестовая группа')
-        self.assertEqual(context['post_image_0'], 'posts/small.gif')
+        self.assertEqual(context['post_image_0'], IMAGE_NAME)
         response = self.authorized_client_author.get(
             reverse('posts:group_list', kwargs={'slug': 'test-slug_dif'}))
         self.assertEqual(len(response.context.get('page_obj')), 0)
@@ -147,7 +237,7 @@ class PostPagesTest(TestCase):
         self.assertEqual(context['post_text_0'], 'Тестовый текст')
         self.assertEqual(context['post_author_0'], 'TestName')
         self.assertEqual(context['post_group_0'], 'Тестовая группа')
-        self.assertEqual(context['post_image_0'], 'posts/small.gif')
+        self.assertEqual(context['post_image_0'], IMAGE_NAME)
 
     def test_post_detail_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
@@ -156,7 +246,7 @@ class PostPagesTest(TestCase):
         self.assertEqual(response.context.get('post').text, 'Тестовый текст')
         self.assertEqual(response.context.get('post').pk, 2128)
         self.assertEqual(
-            response.context.get('post').image, 'posts/small.gif')
+            response.context.get('post').image, IMAGE_NAME)
 
     def test_comment_correct_context(self):
         """Шаблон post_detail сформирован с комментарием."""
@@ -207,6 +297,27 @@ class PostPagesTest(TestCase):
                     kwargs={'username': 'Following'}))
         self.assertEqual(Follow.objects.count(), follows_count - 1)
 
+    def test_follow_set_cached_and_invalidated(self):
+        """Множество подписок читается из кеша и сбрасывается подпиской."""
+        follower = User.objects.get(username='Follower')
+        following = User.objects.get(username='Following')
+        author = User.objects.get(username='TestName')
+        self.assertTrue(follows.is_following(follower, following.pk))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follows.following_among(
+                    follower, [following.pk, author.pk]),
+                {following.pk})
+        address = reverse('posts:profile_follow',
+                          kwargs={'username': 'TestName'})
+        self.authorized_client_follower.get(address)
+        self.authorized_client_follower.get(address)
+        self.assertEqual(
+            Follow.objects.filter(user=follower, author=author).count(), 1)
+        self.assertTrue(follows.is_following(follower, author.pk))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=follower, author=author)
+
     def test_post_appear_followers(self):
         """Новый пост появляется только у подписчиков."""
         Post.objects.create(
@@ -235,6 +346,38 @@ class PostPagesTest(TestCase):
         self.assertEqual(
             len(response.context['page_obj']), posts_count_not_follow)
 
+    def test_follow_timeline_inbox(self):
+        """Лента подписок читается из входящих и пересобирается командой."""
+        self.authorized_client_test_user.get(
+            reverse('posts:profile_follow', kwargs={'username': 'TestName'}))
+        entries = TimelineEntry.objects.filter(user=self.test_user)
+        self.assertEqual(list(entries.values_list('post', flat=True)),
+                         [self.post.pk])
+        response = self.authorized_client_test_user.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        entries.delete()
+        call_command('backfill_timelines', stdout=StringIO())
+        self.assertEqual(entries.count(), 1)
+        self.authorized_client_test_user.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': 'TestName'}))
+        self.assertFalse(entries.exists())
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0)
+    def test_follow_timeline_pulled_author(self):
+        """Посты автора выше порога подмешиваются в ленту при чтении."""
+        author = User.objects.get(username='Following')
+        post = Post.objects.create(author=author, text='Пост без раскладки')
+        self.assertTrue(PulledAuthor.objects.filter(author=author).exists())
+        self.assertFalse(post.timeline_entries.exists())
+        response = self.authorized_client_follower.get(
+            reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+        response = self.authorized_client_author.get(
+            reverse('posts:follow_index'))
+        self.assertNotIn(post, response.context['page_obj'])
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -277,3 +420,388 @@ class PaginatorViewsTest(TestCase):
         """На вторых страницах должно быть четыре поста."""
         rec_number = self.page_records_number(2)
         self.assertEqual(rec_number, 4)
+
+    def test_deep_group_memory_flat(self):
+        """Память на вывод страницы группы не растёт с числом постов."""
+        group = Group.objects.get(slug='TestGroup_1')
+        request = RequestFactory().get('/', {'page': 2})
+        request.user = AnonymousUser()
+
+        def peak_memory():
+            cache.clear()
+            tracemalloc.start()
+            views.group_posts(request, slug=group.slug)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        def add_posts(number):
+            Post.objects.bulk_create(
+                Post(text=f'Пост {i}', author=self.user, group=group)
+                for i in range(number))
+
+        add_posts(10)
+        peak_memory()
+        small = peak_memory()
+        add_posts(2000)
+        self.assertLess(peak_memory(), small * 1.5)
+
+    def test_memory_benchmark_renders_pages(self):
+        """Бенчмарк выводит страницы мимо кеша на каждом размере."""
+        out = StringIO()
+        call_command('feed_memory_benchmark', sizes=[5, 20], stdout=out)
+        rows = out.getvalue().splitlines()[1:]
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            self.assertGreater(int(row.split()[3]), 0)
+
+    def test_cursor_pages(self):
+        """Курсорная пагинация продолжает ленту без OFFSET."""
+        for address in self.templates_pages_names:
+            with self.subTest(address=address):
+                first_page = self.client.get(address).context['page_obj']
+                response = self.client.get(
+                    address, {'after': first_page.next_cursor})
+                second_page = response.context['page_obj']
+                self.assertTrue(second_page.is_cursor)
+                self.assertEqual(len(second_page), 4)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(
+                    set(first_page).isdisjoint(set(second_page)))
+                response = self.client.get(
+                    address, {'before': second_page.previous_cursor})
+                self.assertEqual(
+                    list(response.context['page_obj']), list(first_page))
+
+    def test_numbered_pages_without_count(self):
+        """Страницы по номеру не считают записи и не уходят вглубь."""
+        for address in self.templates_pages_names:
+            with self.subTest(address=address):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(address)
+                sql = ' '.join(query['sql'] for query in queries)
+                self.assertNotIn('COUNT(', sql.upper())
+                self.assertNotIn('OFFSET', sql.upper())
+                page = response.context['page_obj']
+                self.assertTrue(page.has_next())
+                response = self.client.get(address, {'page': 999})
+                self.assertEqual(response.context['page_obj'].number, 1)
+                response = self.client.get(address, {'page': 2})
+                self.assertIsNotNone(
+                    response.context['page_obj'].previous_cursor)
+
+    def test_cursor_invalid_token(self):
+        """Повреждённый токен отдаёт первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'after': 'не-токен'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class FollowTimelinePaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        authors = [User.objects.create_user(username=f'author{i}')
+                   for i in range(3)]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        # Первый пост автора попал во входящие до перевода в режим чтения.
+        Post.objects.create(author=authors[1], text='До порога')
+        for author in authors[1:]:
+            PulledAuthor.objects.create(author=author)
+        for i in range(24):
+            Post.objects.create(author=authors[i % 3], text=f'Пост {i}')
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_pages_merge_inbox_and_pulled_authors(self):
+        """Лента сливает входящие и авторов без раскладки по курсору."""
+        address = reverse('posts:follow_index')
+        pages = [self.client.get(address).context['page_obj']]
+        while pages[-1].has_next():
+            pages.append(self.client.get(
+                address, {'after': pages[-1].next_cursor},
+            ).context['page_obj'])
+        self.assertEqual([post for page in pages for post in page],
+                         self.expected)
+        response = self.client.get(
+            address, {'before': pages[-1].previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(pages[-2]))
+
+    def test_page_reads_bounded_keys(self):
+        """Страница не считает COUNT и не сортирует всю ленту."""
+        first = views.POST_NUM
+        after = self.client.get(
+            reverse('posts:follow_index')).context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:follow_index'), {'after': after})
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([query for query in sql if 'COUNT(' in query])
+        merge, = [query for query in sql if 'UNION ALL' in query]
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {merge}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertEqual(merge.count(f'LIMIT {first + 1}'), 3)
+
+
+class CommentPaginationTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='TestName')
+        cls.post = Post.objects.create(text='Пост', author=author)
+        for i in range(views.COMMENT_NUM + 5):
+            Comment.objects.create(
+                post=cls.post, text=f'Комментарий {i}',
+                author=User.objects.create_user(username=f'Commentor{i}'))
+
+    def test_comments_paginated(self):
+        """Первая страница комментариев в посте, остальные — фрагментом."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), views.COMMENT_NUM)
+        self.assertEqual(comments[0].text,
+                         f'Комментарий {views.COMMENT_NUM + 4}')
+        more_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk})
+        self.assertContains(
+            response, f'{more_url}?after={comments.next_cursor}')
+        self.assertWithinQueryBudget(
+            self.client, f'{more_url}?after={comments.next_cursor}')
+        response = self.client.get(more_url, {'after': comments.next_cursor})
+        rest = response.context['comments']
+        self.assertEqual([comment.text for comment in rest],
+                         [f'Комментарий {i}' for i in range(4, -1, -1)])
+        self.assertNotContains(response, 'data-comments-more')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestName')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_not_modified_until_change(self):
+        """Ленты отвечают 304, пока в них ничего не изменилось."""
+        for address in (
+                reverse('posts:index'),
+                reverse('posts:group_list', kwargs={'slug': 'group'}),
+                reverse('posts:profile', kwargs={'username': 'TestName'})):
+            with self.subTest(address=address):
+                # Предыдущий шаг добавил пост, он и есть последний.
+                latest = Post.objects.latest('pub_date')
+                response = self.client.get(address)
+                self.assertEqual(response['Last-Modified'],
+                                 http_date(latest.pub_date.timestamp()))
+                etag = response['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                Post.objects.create(
+                    text='Новый', author=self.author, group=self.group)
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_not_modified_until_comment(self):
+        """Страница поста отвечает 304 до нового комментария."""
+        address = reverse('posts:post_detail',
+                          kwargs={'post_id': self.post.pk})
+        etag = self.client.get(address)['ETag']
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(address, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class ViewCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='TestName')
+        cls.post = Post.objects.create(text='Пост', author=author)
+
+    def setUp(self):
+        cache.clear()
+        view_counts.flush()
+
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_views_buffered_and_flushed_in_batch(self):
+        """Просмотры копятся в памяти и пишутся одним запросом."""
+        address = reverse('posts:post_detail',
+                          kwargs={'post_id': self.post.pk})
+        for _ in range(3):
+            self.client.get(address)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(view_counts.flush(), 3)
+        self.assertEqual(len([
+            query for query in queries if query['sql'].startswith('UPDATE')
+        ]), 1)
+        self.assertContains(
+            self.client.get(reverse('posts:index')), 'Просмотров: 3')
+
+    def test_views_do_not_change_card_key(self):
+        """Запись просмотров не сбрасывает кеш карточки поста."""
+        key = card_key(self.post)
+        Post.objects.filter(pk=self.post.pk).update(views_count=5)
+        self.post.refresh_from_db()
+        self.assertEqual(card_key(self.post), key)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestName')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            cls.post = Post.objects.create(
+                text=f'Тестовый текст {i}', author=cls.author,
+                group=cls.group)
+            Comment.objects.create(
+                post=cls.post, text=f'Комментарий {i}',
+                author=User.objects.create_user(username=f'Commentor{i}'))
+        cls.image_post = Post.objects.create(
+            text='Пост с картинкой', author=cls.author, group=cls.group,
+            image=SimpleUploadedFile('budget.gif', SMALL_GIF))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def assertUrlsWithinBudget(self, post):
+        kwargs = {
+            'slug': self.group.slug,
+            'username': self.author.username,
+            'post_id': post.pk,
+        }
+        for pattern in posts_urls.urlpatterns:
+            converters = pattern.pattern.converters
+            url = reverse(
+                f'posts:{pattern.name}',
+                kwargs={name: kwargs[name] for name in converters})
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(self.authorized_client, url)
+
+    def test_posts_urls_within_budget(self):
+        """Страницы posts укладываются в бюджет запросов без N+1."""
+        self.assertUrlsWithinBudget(self.post)
+
+    def test_image_pages_within_budget(self):
+        """Изображения не добавляют запросов ни до, ни после нарезки."""
+        self.assertUrlsWithinBudget(self.image_post)
+        thumbnails.generate(self.image_post.image.name)
+        self.assertUrlsWithinBudget(self.image_post)
+
+    def test_writes_within_budget(self):
+        """Создание, правка и подписка укладываются в бюджет."""
+        client = Client()
+        client.force_login(self.author)
+        other = Group.objects.create(title='Другая', slug='other')
+        self.assertWithinQueryBudget(
+            client, reverse('posts:post_create'), data={
+                'text': 'Новый пост', 'group': other.pk,
+                'image': png_file('new.png', (1, 2, 3)),
+            })
+        post = Post.objects.get(text='Новый пост')
+        self.assertWithinQueryBudget(
+            client,
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={
+                'text': 'Правка', 'group': self.group.pk,
+                'image': png_file('edit.png', (4, 5, 6)),
+            })
+        self.assertWithinQueryBudget(
+            client,
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'})
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name=name):
+                self.assertWithinQueryBudget(
+                    self.authorized_client,
+                    reverse(f'posts:{name}', kwargs={
+                        'username': self.author.username}))
+
+
+class SearchViewTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='TestName')
+        Post.objects.bulk_create(
+            Post(text=f'Кошка номер {i}', author=author) for i in range(12))
+        cls.best = Post.objects.create(
+            text='Кошка, кошка и ещё раз кошка', author=author)
+        cls.other = Post.objects.create(text='Собака', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, **params):
+        return self.client.get(reverse('posts:search'), params)
+
+    def test_search_ranked_and_paginated(self):
+        """Поиск ранжирует по релевантности и листает по ключу."""
+        page_obj = self.search(q='КОШ').context['page_obj']
+        self.assertEqual(page_obj[0], self.best)
+        self.assertEqual(len(page_obj), 10)
+        next_page = self.search(
+            q='кош', after=page_obj.next_cursor).context['page_obj']
+        self.assertEqual(len(next_page), 3)
+        self.assertFalse(set(page_obj) & set(next_page))
+        self.assertNotIn(self.other, list(page_obj) + list(next_page))
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс следует за правкой и удалением постов."""
+        Post.objects.filter(pk=self.other.pk).update(text='Попугай')
+        self.assertEqual(list(self.search(q='попугай').context['page_obj']),
+                         [self.other])
+        self.assertFalse(self.search(q='собака').context['page_obj'])
+        self.other.delete()
+        self.assertFalse(self.search(q='попугай').context['page_obj'])
+
+    def test_operators_are_not_interpreted(self):
+        """Синтаксис FTS5 в запросе не ломает поиск."""
+        response = self.search(q='кошка" OR NEAR(')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(
+            self.client, reverse('posts:search') + '?q=кошка')
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.other])
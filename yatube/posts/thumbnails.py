@@ -0,0 +1,206 @@
+"""Миниатюры изображений постов.
+
+Каждый размер из ``POST_THUMBNAILS`` нарезается в нескольких ширинах
+(``POST_THUMBNAIL_WIDTHS``) и форматах: современных из
+``POST_THUMBNAIL_FORMATS``, которые умеет сохранять установленный Pillow,
+и JPEG для остальных клиентов. Шаблоны выводят их через ``<picture>`` и
+``srcset``, так что браузер сам выбирает подходящий файл.
+
+Все варианты создаются сразу после загрузки изображения в фоновом пуле
+потоков, а не при первом показе страницы, и их адреса кладутся в кеш:
+страница получает варианты всех своих изображений одним
+``get_many``, не спрашивая хранилище ключей sorl о каждой миниатюре.
+Если вариантов в кеше нет, страница показывает исходный файл и снова
+ставит нарезку в очередь; готовые варианты сбрасывают кеш страниц поста.
+Блокировка в общем кеше на каждый исходный файл не даёт двум процессам
+одновременно нарезать одно и то же изображение.
+"""
+import logging
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+from sorl.thumbnail import base, get_thumbnail
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from core import page_cache
+from core.background import WorkerPool
+from core.locks import cache_lock
+from . import scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 60 * 5
+FALLBACK_FORMAT = 'JPEG'
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+EXTENSIONS = dict(base.EXTENSIONS, AVIF='avif')
+
+_pool = WorkerPool('THUMBNAIL_WORKERS', 'thumbnails')
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, знающий расширение файлов AVIF."""
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        extension = EXTENSIONS[options['format']]
+        return (f'{base.settings.THUMBNAIL_PREFIX}'
+                f'{key[:2]}/{key[2:4]}/{key}.{extension}')
+
+
+def formats():
+    """Форматы вариантов: поддержанные Pillow современные и JPEG."""
+    Image.init()
+    modern = [
+        image_format for image_format in settings.POST_THUMBNAIL_FORMATS
+        if image_format in Image.SAVE
+    ]
+    return modern + [FALLBACK_FORMAT]
+
+
+def widths(name):
+    """Ширины вариантов размера ``name``, не больше исходной."""
+    width, _ = size(name)
+    return sorted(
+        {min(variant, width) for variant in settings.POST_THUMBNAIL_WIDTHS}
+        | {width})
+
+
+def size(name, width=None):
+    """Ширина и высота варианта размера ``name``."""
+    full_width, full_height = map(
+        int, settings.POST_THUMBNAILS[name][0].split('x'))
+    width = width or full_width
+    return width, round(full_height * width / full_width)
+
+
+def source_file(name):
+    """Исходный файл ``name`` в хранилище поля ``Post.image``.
+
+    sorl ищет миниатюры по имени и хранилищу исходника, а шаблоны передают
+    ``FieldFile`` со своим хранилищем; голое имя получило бы другой ключ.
+    """
+    return ImageFile(name, storage=Post._meta.get_field('image').storage)
+
+
+def thumbnail(image, name, width=None, image_format=FALLBACK_FORMAT):
+    """Миниатюра ``image`` размера ``name`` нужной ширины и формата."""
+    options = settings.POST_THUMBNAILS[name][1]
+    width, height = size(name, width)
+    return get_thumbnail(
+        image, f'{width}x{height}', format=image_format, **options)
+
+
+def picture(image, name):
+    """Варианты ``image`` для разметки ``<picture>``.
+
+    ``sources`` — пары (MIME-тип, srcset) современных форматов, ``src`` и
+    ``srcset`` — запасной JPEG, ``size`` — размер для атрибутов ``<img>``.
+    """
+    sources = []
+    for image_format in formats():
+        srcset = ', '.join(
+            f'{thumbnail(image, name, width, image_format).url} {width}w'
+            for width in widths(name))
+        sources.append((MIME_TYPES[image_format], srcset))
+    _, fallback_srcset = sources.pop()
+    return {
+        'sources': sources,
+        'src': thumbnail(image, name).url,
+        'srcset': fallback_srcset,
+        'size': size(name),
+    }
+
+
+def picture_key(source, name):
+    """Ключ готовых вариантов файла ``source`` размера ``name`` в кеше."""
+    version = repr((source, name, settings.POST_THUMBNAILS[name],
+                    settings.POST_THUMBNAIL_WIDTHS, formats()))
+    return f'picture:{md5(version.encode()).hexdigest()}'
+
+
+def pictures(images, name):
+    """Готовые варианты ``<picture>`` изображений ``images`` по именам файлов.
+
+    Варианты берутся из кеша одним ``get_many``. Для изображений без
+    вариантов нарезка ставится в очередь, а в результат они не попадают.
+    """
+    images = [image for image in images if image]
+    keys = {image.name: picture_key(image.name, name) for image in images}
+    found = cache.get_many(list(keys.values()))
+    for source, key in keys.items():
+        if key not in found:
+            schedule(source)
+    return {source: found[key] for source, key in keys.items()
+            if key in found}
+
+
+def forget_pictures(source):
+    """Удаляет из кеша варианты файла ``source`` перед его удалением."""
+    cache.delete_many(
+        [picture_key(source, name) for name in settings.POST_THUMBNAILS])
+
+
+def generate(source):
+    """Создаёт все миниатюры файла ``source`` и кладёт их варианты в кеш.
+
+    Возвращает False, если файл уже обрабатывает другой процесс.
+    """
+    with cache_lock(f'thumbnail:{source}', LOCK_TIMEOUT) as acquired:
+        if acquired:
+            image = source_file(source)
+            for name in settings.POST_THUMBNAILS:
+                for image_format in formats():
+                    for width in widths(name):
+                        thumbnail(image, name, width, image_format)
+            cache.set_many({
+                picture_key(source, name): picture(image, name)
+                for name in settings.POST_THUMBNAILS
+            }, None)
+            cache.delete(_pending_key(source))
+            _invalidate_pages(source)
+        return acquired
+
+
+def _invalidate_pages(source):
+    # Страницы, показанные до нарезки, выводят исходный файл.
+    posts = Post.objects.filter(image=source).values_list(
+        'pk', 'author__username', 'group__slug')
+    changed = {scopes.FEED}
+    for pk, username, slug in posts:
+        changed.update((scopes.post(pk), scopes.author(username)))
+        if slug:
+            changed.add(scopes.group(slug))
+    page_cache.bump(*changed)
+
+
+def _generate_logged(source):
+    try:
+        generate(source)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', source)
+
+
+def _pending_key(source):
+    return f'thumbnail-pending:{source}'
+
+
+def schedule(source):
+    """Ставит создание миниатюр в фоновый пул после фиксации транзакции.
+
+    Файл, уже стоящий в очереди, второй раз не ставится: страницы без
+    готовых вариантов просят нарезку при каждом показе. Если нарезка
+    не удалась, отметка истекает через ``LOCK_TIMEOUT`` и её можно
+    поставить снова. При ``THUMBNAIL_WORKERS = 0`` миниатюры создаются
+    в текущем потоке.
+    """
+    if not cache.add(_pending_key(source), True, LOCK_TIMEOUT):
+        return
+    _pool.submit_on_commit(_generate_logged, source)
@@ -0,0 +1,213 @@
+"""Лента подписок, материализованная при записи (fan-out-on-write).
+
+Каждый новый пост сразу раскладывается во «входящие» подписчиков автора
+(таблица ``TimelineEntry``), поэтому страница подписок читает только
+свои входящие по индексу ``(user, -pub_date, -post)`` без join с ``Follow``.
+
+У авторов с числом подписчиков больше ``TIMELINE_FANOUT_THRESHOLD``
+раскладка отключается (``PulledAuthor``): их посты подмешиваются в ленту
+при чтении. Так одна публикация пишет не больше порога строк.
+"""
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from core.db import insert_from_select
+from .models import Follow, Post, PulledAuthor, TimelineEntry, UserStats
+from .pagination import (POST_ORDERING, BaseCursorPaginator, CursorPage,
+                         as_page, decode_cursor, encode_cursor,
+                         keyset_filter, reverse_ordering)
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def _insert(entries):
+    """Вставляет записи пачками, не собирая их все в памяти."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, FANOUT_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_pulled(author_id):
+    return PulledAuthor.objects.filter(author_id=author_id).exists()
+
+
+def _exceeds_threshold(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает пост во входящие всех подписчиков автора.
+
+    Если подписчиков больше порога, автор переводится в режим чтения
+    при запросе и пост никуда не раскладывается.
+    """
+    if is_pulled(post.author_id):
+        return
+    if _exceeds_threshold(post.author_id):
+        PulledAuthor.objects.get_or_create(author_id=post.author_id)
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in follower_ids.iterator()
+    )
+
+
+def pull_popular_authors():
+    """Отключает раскладку у авторов, у которых подписчиков больше порога.
+
+    Нужна после загрузки подписок в обход сигналов: иначе ``rebuild``
+    разложит посты популярных авторов всем подписчикам.
+    """
+    author_ids = UserStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list('user_id', flat=True)
+    PulledAuthor.objects.bulk_create(
+        [PulledAuthor(author_id=author_id)
+         for author_id in author_ids.iterator()],
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author(user_id, author_id):
+    """Добавляет во входящие подписчика уже опубликованные посты автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает посты автора из входящих бывшего подписчика."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(user_ids=None, reset=False):
+    """Пересобирает входящие по таблице подписок, возвращает число записей.
+
+    Без ``user_ids`` обрабатываются все пользователи; ``reset`` сначала
+    очищает их входящие, чтобы убрать записи от отменённых подписок.
+    Популярные авторы сначала переводятся в режим чтения при запросе.
+    Записи вставляются одним ``INSERT ... SELECT`` из подписок и постов
+    их авторов; уже существующие пропускаются.
+    """
+    pull_popular_authors()
+    follows = Follow.objects.filter(
+        author__pulled_timeline__isnull=True,
+        author__posts__isnull=False,
+    )
+    entries = TimelineEntry.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        entries = entries.filter(user_id__in=user_ids)
+    if reset:
+        entries.delete()
+    return insert_from_select(
+        TimelineEntry, ('user', 'post', 'pub_date'), follows.values_list(
+            'user_id', 'author__posts__id', 'author__posts__pub_date',
+        ).order_by(), ignore_conflicts=True)
+
+
+def pulled_author_ids(user):
+    """id авторов из подписок, чьи посты подмешиваются при чтении."""
+    return list(Follow.objects.filter(
+        user=user, author__pulled_timeline__isnull=False
+    ).values_list('author_id', flat=True))
+
+
+class TimelinePaginator(BaseCursorPaginator):
+    """Лента подписок по ключу ``(pub_date, id поста)`` без OFFSET и COUNT.
+
+    Источники ленты — входящие пользователя и посты каждого автора,
+    читаемого при запросе. Из каждого по его индексу берётся не больше
+    ``per_page + 1`` ключей за курсором (все источники одним запросом
+    UNION ALL), а ключи сливаются ``heapq.merge``. Страница стоит
+    одинаково при любом размере входящих и числе постов авторов.
+    Первая страница — ``Page`` Django (см. ``as_page``), остальные —
+    ``CursorPage``.
+    """
+
+    def __init__(self, user, per_page):
+        self.user = user
+        self.per_page = int(per_page)
+
+    def cursor_for(self, post):
+        return encode_cursor((post.pub_date, post.pk))
+
+    def _sources(self):
+        yield TimelineEntry.objects.filter(user=self.user), 'post_id'
+        for author_id in pulled_author_ids(self.user):
+            yield Post.objects.filter(author_id=author_id), 'id'
+
+    def _keys(self, values, forward):
+        """До ``per_page + 1`` ключей постов за курсором в порядке ленты."""
+        arms, params = [], []
+        for number, (queryset, id_field) in enumerate(self._sources()):
+            ordering = ('-pub_date', f'-{id_field}')
+            if values is not None:
+                queryset = queryset.filter(
+                    keyset_filter(ordering, values, forward))
+            if not forward:
+                ordering = reverse_ordering(ordering)
+            queryset = queryset.order_by(*ordering).values_list(
+                'pub_date', id_field)[:self.per_page + 1]
+            sql, arm_params = queryset.query.sql_with_params()
+            arms.append(f'SELECT {number}, * FROM ({sql})')
+            params.extend(arm_params)
+        with connection.cursor() as cursor:
+            cursor.execute(' UNION ALL '.join(arms), params)
+            rows = cursor.fetchall()
+        sources = defaultdict(list)
+        for number, pub_date, post_id in rows:
+            sources[number].append((pub_date, post_id))
+        # UNION ALL не обязан сохранять порядок источников: досортировка
+        # стоит не больше per_page + 1 ключей на источник.
+        merged = heapq.merge(
+            *[sorted(keys, reverse=forward) for keys in sources.values()],
+            reverse=forward)
+        keys = []
+        for key in merged:
+            # Пост мог попасть во входящие до того, как автора стали
+            # читать при запросе.
+            if not keys or keys[-1] != key:
+                keys.append(key)
+            if len(keys) > self.per_page:
+                break
+        return keys
+
+    def page(self, after=None, before=None):
+        """Страница после токена ``after`` или перед токеном ``before``."""
+        token = before or after
+        values = decode_cursor(token, Post, POST_ORDERING) if token else None
+        forward = not before
+        keys = self._keys(values, forward)
+        more = len(keys) > self.per_page
+        keys = keys[:self.per_page]
+        if not forward:
+            keys.reverse()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [post_id for _, post_id in keys])
+        # Пост мог быть удалён между двумя запросами.
+        rows = [posts[post_id] for _, post_id in keys if post_id in posts]
+        if not token:
+            return as_page(CursorPage(rows, more, False, self))
+        if forward:
+            return CursorPage(rows, more, True, self)
+        return CursorPage(rows, True, more, self)
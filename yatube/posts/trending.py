@@ -0,0 +1,143 @@
+"""Популярные посты сайта и групп.
+
+События (новый пост, комментарий, подписка на автора) сразу добавляют
+очки посту в счётчик текущего часа ``TrendingBucket`` — атомарным
+``UPDATE``, как денормализованные счётчики. Подписка засчитывается
+последнему посту автора: обычно подписываются, прочитав его.
+
+Оценка поста — сумма очков за последние ``WINDOW_BUCKETS`` часов, где
+очки каждого часа затухают вдвое за ``HALF_LIFE_BUCKETS`` часов. Её
+считает ``refresh`` одним запросом по счётчикам окна, не трогая
+``Comment``, и кладёт в кеш готовые списки id лучших ``TOP_N`` постов
+сайта и каждой группы. Страница популярного только читает этот список;
+устаревший список пересчитывает один процесс, остальные отдают старый.
+Пока списка в кеше нет совсем, остальные недолго ждут его появления,
+а не дождавшись, отдают пустые списки.
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.utils import timezone
+
+from core.locks import cache_lock
+from .models import Post, TrendingBucket
+
+BUCKET_SECONDS = 60 * 60
+WINDOW_BUCKETS = 48
+HALF_LIFE_BUCKETS = 6
+TOP_N = 20
+REFRESH_INTERVAL = 60 * 5
+CACHE_KEY = 'trending'
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+POST_POINTS = 1
+COMMENT_POINTS = 3
+FOLLOW_POINTS = 2
+
+
+def current_bucket(now=None):
+    return int((time.time() if now is None else now) // BUCKET_SECONDS)
+
+
+def record(post, points):
+    """Добавляет посту ``points`` очков в счётчике текущего часа."""
+    bucket = current_bucket()
+    counters = TrendingBucket.objects.filter(post_id=post.pk, bucket=bucket)
+    if not counters.update(points=F('points') + points):
+        counter, created = TrendingBucket.objects.get_or_create(
+            post_id=post.pk, bucket=bucket,
+            defaults={'group_id': post.group_id, 'points': points})
+        if not created:
+            counters.update(points=F('points') + points)
+
+
+def record_follow(author_id):
+    """Засчитывает подписку последнему посту автора в окне."""
+    since = timezone.now() - timedelta(
+        seconds=WINDOW_BUCKETS * BUCKET_SECONDS)
+    post = Post.objects.filter(
+        author_id=author_id, pub_date__gte=since,
+    ).order_by('-pub_date', '-id').only('pk', 'group_id').first()
+    if post is not None:
+        record(post, FOLLOW_POINTS)
+
+
+def regroup(post_ids, group_id):
+    """Переносит очки постов, перенесённых в группу ``group_id``."""
+    TrendingBucket.objects.filter(post_id__in=post_ids).update(
+        group_id=group_id)
+
+
+def scores(now=None):
+    """Оценки постов окна по убыванию: (post_id, group_id, score)."""
+    last = current_bucket(now)
+    first = last - WINDOW_BUCKETS + 1
+    decay = Case(
+        *[When(bucket=bucket,
+               then=Value(0.5 ** ((last - bucket) / HALF_LIFE_BUCKETS)))
+          for bucket in range(first, last + 1)],
+        default=Value(0.0), output_field=FloatField())
+    return TrendingBucket.objects.filter(
+        bucket__gte=first, bucket__lte=last,
+    ).values('post_id', 'group_id').annotate(
+        score=Sum(F('points') * decay, output_field=FloatField()),
+    ).order_by('-score', '-post_id').values_list(
+        'post_id', 'group_id', 'score')
+
+
+def refresh(now=None):
+    """Пересчитывает списки популярного и удаляет счётчики вне окна."""
+    site, groups = [], {}
+    for post_id, group_id, _ in scores(now).iterator():
+        if len(site) < TOP_N:
+            site.append(post_id)
+        if group_id is not None:
+            group = groups.setdefault(group_id, [])
+            if len(group) < TOP_N:
+                group.append(post_id)
+    lists = {'site': site, 'groups': groups, 'refreshed': time.time()}
+    cache.set(CACHE_KEY, lists, None)
+    TrendingBucket.objects.filter(
+        bucket__lt=current_bucket(now) - WINDOW_BUCKETS + 1).delete()
+    return lists
+
+
+def _wait_for_lists(deadline):
+    """Ждёт, пока владелец блокировки положит списки в кеш."""
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        lists = cache.get(CACHE_KEY)
+        if lists is not None:
+            return lists
+    return None
+
+
+def _lists():
+    lists = cache.get(CACHE_KEY)
+    if lists is None or time.time() - lists['refreshed'] > REFRESH_INTERVAL:
+        with cache_lock(CACHE_KEY) as acquired:
+            if acquired:
+                return refresh()
+        if lists is None:
+            lists = _wait_for_lists(time.monotonic() + LOCK_WAIT)
+    if lists is None:
+        return {'site': [], 'groups': {}, 'refreshed': 0.0}
+    return lists
+
+
+def top_ids(group_id=None):
+    """id популярных постов сайта или группы ``group_id`` по порядку."""
+    lists = _lists()
+    if group_id is None:
+        return lists['site']
+    return lists['groups'].get(group_id, [])
+
+
+def top_posts(group_id=None):
+    """Популярные посты сайта или группы для вывода в ленте."""
+    ids = top_ids(group_id)
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
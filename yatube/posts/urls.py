@@ -6,9 +6,15 @@ app_name = 'posts'
 urlpatterns = [
     path("", views.index, name='index'),
     path("group/<slug:slug>/", views.group_posts, name='group_list'),
+    path("group/<slug:slug>/trending/", views.trending_posts,
+         name='group_trending'),
     path("profile/<str:username>/", views.profile, name='profile'),
     path("posts/<int:post_id>/", views.post_detail, name='post_detail'),
+    path("search/", views.post_search, name='search'),
+    path("trending/", views.trending_posts, name='trending'),
     path("create/", views.post_create, name='post_create'),
+    path("posts/<int:post_id>/comments/",
+         views.post_comments, name='post_comments'),
     path("posts/<int:post_id>/edit/", views.post_edit, name='post_edit'),
     path("posts/<int:post_id>/comment/",
          views.add_comment, name='add_comment'),
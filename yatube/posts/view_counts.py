@@ -0,0 +1,84 @@
+"""Счётчики просмотров постов с отложенной записью (write-behind).
+
+``UPDATE`` на каждый просмотр упирался бы в единственную блокировку
+записи SQLite. Поэтому просмотры копятся в памяти процесса, а ``flush``
+записывает их пачкой в одной транзакции: по одному ``UPDATE`` на группу
+постов с одинаковым приростом. Запись происходит при первом просмотре
+после ``VIEW_COUNT_FLUSH_INTERVAL`` секунд или когда в буфере набралось
+``MAX_PENDING`` постов, а также при штатном завершении процесса.
+
+При падении процесса теряются только просмотры с последней записи —
+не больше интервала на процесс. Если база занята, прирост возвращается
+в буфер и пишется в следующий раз.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from .models import Post
+
+MAX_PENDING = 10000
+UPDATE_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+_pending = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def record(post_id):
+    """Засчитывает просмотр поста; иногда записывает накопленное."""
+    with _lock:
+        _pending[post_id] += 1
+        due = (
+            time.monotonic() - _last_flush
+            >= settings.VIEW_COUNT_FLUSH_INTERVAL
+            or len(_pending) >= MAX_PENDING
+        )
+    if due:
+        flush()
+
+
+def _updates(pending):
+    by_views = defaultdict(list)
+    for post_id, views in pending.items():
+        by_views[views].append(post_id)
+    for views, post_ids in by_views.items():
+        for start in range(0, len(post_ids), UPDATE_BATCH_SIZE):
+            yield post_ids[start:start + UPDATE_BATCH_SIZE], views
+
+
+def _write(pending):
+    updates = list(_updates(pending))
+    with transaction.atomic():
+        for post_ids, views in updates:
+            Post.objects.filter(pk__in=post_ids).update(
+                views_count=F('views_count') + views)
+
+
+def flush():
+    """Записывает накопленные просмотры; возвращает их число."""
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, Counter()
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    try:
+        _write(pending)
+    except DatabaseError:
+        logger.exception('Не удалось записать просмотры, повтор позже')
+        with _lock:
+            _pending.update(pending)
+        return 0
+    return sum(pending.values())
+
+
+atexit.register(flush)
@@ -1,67 +1,119 @@
-from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, User, Follow
+from core.page_cache import cached_page
+from core.query_budget import query_budget
+from . import (conditional, follows, scopes, search, timeline, trending,
+               view_counts)
+from .models import Comment, Post, Group, User, Follow
 from .forms import PostForm, CommentForm
+from .pagination import CursorPaginator
 
 POST_NUM = 10
+COMMENT_NUM = 20
+COMMENT_ORDERING = ('-created', '-id')
 
 
 def paginator(request, post_list, post_num):
-    paginator = Paginator(post_list, post_num)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
-
-
-@cache_page(20, key_prefix="index_page")
+    cursor_paginator = CursorPaginator(post_list, post_num)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        return cursor_paginator.get_page(after=after, before=before)
+    return cursor_paginator.numbered_page(request.GET.get('page'))
+
+
+@conditional.index_page
+@cached_page(settings.PAGE_CACHE_TIMEOUT, 'index_page', scopes.index_page,
+             shared=True)
+@query_budget(5)
 def index(request):
     template = "posts/index.html"
-    post_list = Post.objects.all()
+    post_list = Post.objects.select_related('author', 'group')
     context = {'page_obj': paginator(request, post_list, POST_NUM)}
     return render(request, template, context)
 
 
+@conditional.group_page
+@cached_page(settings.PAGE_CACHE_TIMEOUT, 'group_page', scopes.group_page,
+             shared=True)
+@query_budget(6)
 def group_posts(request, slug):
     template = "posts/group_list.html"
-    group = get_object_or_404(Group.objects.prefetch_related('posts'),
-                              slug=slug)
-    post_list = group.posts.all()
+    group = get_object_or_404(Group, slug=slug)
+    post_list = group.posts.select_related('author', 'group')
     context = {'group': group,
                'page_obj': paginator(request, post_list, POST_NUM)}
     return render(request, template, context)
 
 
+@conditional.profile_page
+@cached_page(settings.PAGE_CACHE_TIMEOUT, 'profile_page',
+             scopes.profile_page, shared=True)
+@query_budget(7)
 def profile(request, username):
     template = "posts/profile.html"
-    author = get_object_or_404(User.objects.prefetch_related('posts'),
-                               username=username)
-    post_list = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = author.posts.select_related('author', 'group')
     context = {'author': author,
                'page_obj': paginator(request, post_list, POST_NUM)}
-    if not str(request.user) == 'AnonymousUser':
-        following_authors = User.objects.filter(following__user=request.user)
-        if author in following_authors:
-            following = True
-        else:
-            following = False
-        context = {'author': author, 'following': following,
-                   'page_obj': paginator(request, post_list, POST_NUM)}
     return render(request, template, context)
 
 
+@query_budget(6)
+def trending_posts(request, slug=None):
+    """Популярные посты сайта или группы из готового списка."""
+    template = "posts/trending.html"
+    group = None
+    if slug is not None:
+        group = get_object_or_404(Group, slug=slug)
+    posts = trending.top_posts(group.pk if group else None)
+    context = {'group': group, 'posts': posts}
+    return render(request, template, context)
+
+
+@cached_page(settings.PAGE_CACHE_TIMEOUT, 'search_page', scopes.index_page,
+             shared=True)
+@query_budget(5)
+def post_search(request):
+    template = "posts/search.html"
+    query = request.GET.get('q', '').strip()
+    page_obj = search.SearchPaginator(query, POST_NUM).get_page(
+        after=request.GET.get('after'))
+    context = {'query': query, 'page_obj': page_obj}
+    return render(request, template, context)
+
+
+@conditional.post_page
+@query_budget(8)
 def post_detail(request, post_id):
     template = "posts/post_detail.html"
     post = get_object_or_404(
-        Post.objects.select_related('group', 'author'), pk=post_id)
-    comment_list = post.comments.all()
+        Post.objects.select_related('group', 'author__stats'), pk=post_id)
+    view_counts.record(post.pk)
+    comments = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENT_NUM, COMMENT_ORDERING).page()
     form = CommentForm(request.POST or None)
-    context = {'post': post, 'comments': comment_list, 'form': form}
+    context = {'post': post, 'comments': comments, 'form': form}
     return render(request, template, context)
 
 
+@query_budget(2)
+def post_comments(request, post_id):
+    """Следующая страница комментариев — фрагмент для ``post_detail``."""
+    comments = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENT_NUM, COMMENT_ORDERING).get_page(
+            after=request.GET.get('after'))
+    context = {'post_id': post_id, 'comments': comments}
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
+@query_budget(23)
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -75,6 +127,7 @@ def post_create(request):
 
 
 @login_required
+@query_budget(19)
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user == post.author:
@@ -94,6 +147,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@query_budget(6)
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -105,32 +159,33 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(7)
 def follow_index(request):
     template = "posts/follow.html"
-    post_list = Post.objects.filter(author__following__user=request.user)
-    context = {'page_obj': paginator(request, post_list, POST_NUM)}
+    page_obj = timeline.TimelinePaginator(request.user, POST_NUM).get_page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
+    context = {'page_obj': page_obj}
     return render(request, template, context)
 
 
 @login_required
+@query_budget(14)
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    following_authors = User.objects.filter(following__user=request.user)
-    if user == author or author in following_authors:
-        return redirect('posts:profile', username=username)
-    follow = Follow(
-        user=user,
-        author=author
-    )
-    follow.save()
+    if user != author and not follows.is_following(user, author.pk):
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=author)
+        except IntegrityError:
+            # Повторный запрос: подписка уже создана.
+            pass
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@query_budget(10)
 def profile_unfollow(request, username):
-    user = request.user
     author = get_object_or_404(User, username=username)
-    if Follow.objects.filter(user=user, author=author).exists():
-        Follow.objects.filter(user=user, author=author).delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -32,12 +36,72 @@ ALLOWED_HOSTS = [
     'testserver',
 ]
 
+# Per-process memory cache in front of a SQLite file shared by all workers;
+# writes in one worker evict the in-memory copies in the others.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+            'POLL_INTERVAL': 0.5,
+        },
     }
 }
 
+# Test runs get their own cache file, removed on exit, so cache.clear() in
+# tests does not wipe the development server's cache.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    atexit.register(shutil.rmtree, TEST_CACHE_DIR, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(
+        TEST_CACHE_DIR, 'cache.sqlite3')
+
+# Authors with more followers than this are not fanned out into follower
+# inboxes on post; their posts are merged into the follow feed on read.
+TIMELINE_FANOUT_THRESHOLD = 10000
+
+# Feed pages are invalidated by model signals (see core/page_cache.py),
+# the timeout only bounds how long unused copies occupy the cache.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Rendered post cards are keyed by a version that changes on every edit,
+# so they can live in the cache for a long time.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Uploaded originals are normalized once (see posts/images.py): the longer
+# side is capped, EXIF is applied and stripped, bigger images are rejected.
+POST_IMAGE_MAX_SIZE = 2560
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_QUALITY = 85
+
+# Uploads above this size are streamed to a temporary file, not kept in memory.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
+# Thumbnail geometries of post images used by the templates. Each one is
+# cut in several widths and in the modern formats Pillow can write (plus a
+# JPEG fallback), all generated by a background pool right after an upload.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+POST_THUMBNAIL_WIDTHS = (480, 960)
+POST_THUMBNAIL_FORMATS = ('AVIF', 'WEBP')
+# Test runs cut thumbnails inline, so they never race a background pool that
+# is still writing into MEDIA_ROOT.
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+
+# Post views are buffered in process memory and written in batches at most
+# this often (seconds); a crashed worker loses at most one interval of views.
+# Test runs write every view through at once.
+VIEW_COUNT_FLUSH_INTERVAL = 0 if TESTING else 10
+
+# Admin bulk actions over posts run in chunks in this many background
+# threads; 0 (test runs) runs them inline after the request commits.
+BULK_JOB_WORKERS = 0 if TESTING else 1
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -54,6 +118,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +130,12 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Count SQL queries per page and report pages over their declared budget
+# or repeating one query shape (N+1); test runs fail on such pages.
+# See core/query_budget.py.
+QUERY_BUDGET_ENABLED = DEBUG or TESTING
+QUERY_BUDGET_RAISE = TESTING
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'